@@ -0,0 +1,177 @@
+#!/usr/bin/env python3.8
+
+"""Time and measure a generated Python parser on some input files.
+
+Example:
+
+$ python -m scripts.benchmark -g data/exprs.gram data/large.txt data/xl.txt
+
+The grammar is compiled with the Python generator into a temporary
+module, then each input file is parsed --repeat times.  The best wall
+time and the peak memory allocated while parsing (as reported by
+tracemalloc) are printed for every file.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, List, Optional, Tuple, Type
+
+sys.path.insert(0, os.getcwd())
+from pegen.batch import parse_file
+from pegen.build import build_parser, build_python_generator
+from pegen.parser import Parser
+from pegen.token_cache import TokenCache
+from pegen.tokenizer import CompactTokenizer, Tokenizer
+from tests.utils import import_file
+
+argparser = argparse.ArgumentParser(
+    prog="benchmark", description="Benchmark a generated Python parser"
+)
+argparser.add_argument(
+    "-g", "--grammar-file", default="data/exprs.gram", help="Grammar file path"
+)
+argparser.add_argument(
+    "--memoize",
+    choices=["all", "flagged"],
+    default="all",
+    help="Memoize all rules (default) or only those flagged with (memo)",
+)
+argparser.add_argument(
+    "--memo-plan", metavar="PLAN", help="Memoize only the rules listed in this memo plan"
+)
+argparser.add_argument(
+    "--prune", action="store_true", help="Generate a parser that prunes its memo and tokens"
+)
+argparser.add_argument(
+    "--inline-memo", action="store_true", help="Inline memo table lookups in the parser"
+)
+argparser.add_argument(
+    "--first-set-guards", action="store_true", help="Guard alternatives with FIRST sets"
+)
+argparser.add_argument(
+    "--optimize", action="store_true", help="Inline small rules and drop unreachable ones"
+)
+argparser.add_argument(
+    "--left-factor", action="store_true", help="Parse shared leading items of alternatives once"
+)
+argparser.add_argument(
+    "--skip-actions", action="store_true", help="Benchmark a recognizer that skips the actions"
+)
+argparser.add_argument(
+    "--compact-tokens", action="store_true", help="Store tokens in a CompactTokenizer"
+)
+argparser.add_argument(
+    "--token-cache", metavar="DIR", help="Cache token streams in this directory"
+)
+argparser.add_argument(
+    "--stream",
+    metavar="RULE",
+    help="Parse each file line by line as a sequence of RULE (see Parser.stream())",
+)
+argparser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs")
+argparser.add_argument("files", nargs="+", help="Input files to parse")
+
+
+def build_parser_class(
+    grammar_file: str,
+    memoize_all: bool = True,
+    memo_plan_file: Optional[str] = None,
+    prune: bool = False,
+    inline_memo: bool = False,
+    first_set_guards: bool = False,
+    optimize: bool = False,
+    left_factor: bool = False,
+    skip_actions: bool = False,
+) -> Type[Parser]:
+    grammar, _, _ = build_parser(grammar_file)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_file = os.path.join(tmpdir, "parse.py")
+        build_python_generator(
+            grammar,
+            grammar_file,
+            output_file,
+            memoize_all=memoize_all,
+            memo_plan_file=memo_plan_file,
+            prune=prune,
+            inline_memo=inline_memo,
+            first_set_guards=first_set_guards,
+            optimize=optimize,
+            left_factor=left_factor,
+            skip_actions=skip_actions,
+        )
+        module = import_file("parse", output_file)
+    return module.GeneratedParser
+
+
+def time_parse(
+    parser_class: Type[Parser],
+    filename: str,
+    repeat: int,
+    tokenizer_class: Type[Tokenizer] = Tokenizer,
+    token_cache: Optional[TokenCache] = None,
+    stream: Optional[str] = None,
+) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parse_file(parser_class, filename, tokenizer_class, token_cache, stream)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def measure_memory(
+    parser_class: Type[Parser],
+    filename: str,
+    tokenizer_class: Type[Tokenizer] = Tokenizer,
+    token_cache: Optional[TokenCache] = None,
+    stream: Optional[str] = None,
+) -> Tuple[int, int]:
+    tracemalloc.start()
+    try:
+        tree = parse_file(parser_class, filename, tokenizer_class, token_cache, stream)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tree
+    return current, peak
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    if args.stream and args.token_cache:
+        argparser.error("--stream reads files line by line and cannot use --token-cache")
+    parser_class = build_parser_class(
+        args.grammar_file,
+        memoize_all=args.memoize == "all",
+        memo_plan_file=args.memo_plan,
+        prune=args.prune,
+        inline_memo=args.inline_memo,
+        first_set_guards=args.first_set_guards,
+        optimize=args.optimize,
+        left_factor=args.left_factor,
+        skip_actions=args.skip_actions,
+    )
+    tokenizer_class = CompactTokenizer if args.compact_tokens else Tokenizer
+    token_cache = TokenCache(args.token_cache) if args.token_cache else None
+    MiB = 2 ** 20
+    for filename in args.files:
+        best = time_parse(
+            parser_class, filename, args.repeat, tokenizer_class, token_cache, args.stream
+        )
+        current, peak = measure_memory(
+            parser_class, filename, tokenizer_class, token_cache, args.stream
+        )
+        print(
+            f"{filename:30} {best:8.3f} sec"
+            f"  retained {current / MiB:8.2f} MiB  peak {peak / MiB:8.2f} MiB"
+        )
+    if token_cache is not None:
+        print(f"Token cache: {token_cache.report()}")
+
+
+if __name__ == "__main__":
+    main()
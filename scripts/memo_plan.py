@@ -0,0 +1,62 @@
+#!/usr/bin/env python3.8
+
+"""Produce a memo plan for a grammar from a corpus of input files.
+
+Example:
+
+$ python -m scripts.memo_plan -g data/exprs.gram -o exprs.plan data/*.txt
+$ python -m pegen --memo-plan exprs.plan data/exprs.gram -o parse.py
+
+The grammar is compiled with every rule memoized, then each input file is
+parsed while counting memo hits, misses and stores per rule.  The plan
+lists the rules whose hit rate reaches --min-hit-rate; pass it to pegen
+(or build_python_parser_and_generator(memo_plan_file=...)) to memoize
+only those rules.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+from pegen.parser import DEFAULT_MIN_HIT_RATE, MemoStats
+from pegen.tokenizer import Tokenizer, generate_source_tokens, read_source
+from scripts.benchmark import build_parser_class
+
+argparser = argparse.ArgumentParser(
+    prog="memo_plan", description="Profile memoization of a generated Python parser"
+)
+argparser.add_argument("-g", "--grammar-file", required=True, help="Grammar file path")
+argparser.add_argument(
+    "-o", "--output", metavar="PLAN", help="Where to write the memo plan (default: stdout)"
+)
+argparser.add_argument(
+    "--min-hit-rate",
+    type=float,
+    default=DEFAULT_MIN_HIT_RATE,
+    help="Fraction of calls that must hit the cache for a rule to be memoized",
+)
+argparser.add_argument("files", nargs="+", help="Input files to parse")
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    parser_class = build_parser_class(args.grammar_file)
+    stats = MemoStats()
+    for filename in args.files:
+        with open(filename, "rb") as file:
+            tokenizer = Tokenizer(generate_source_tokens(read_source(file)))
+            parser = parser_class(tokenizer, memo_stats=stats)
+            if not parser.start():
+                err = parser.make_syntax_error(filename)
+                print(f"{filename}: {err.__class__.__name__}: {err}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            stats.write_plan(file, args.min_hit_rate)
+    else:
+        stats.write_plan(sys.stdout, args.min_hit_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,15 @@ import argparse
 import ast
 import os
 import sys
+import tempfile
 import time
 import traceback
-from glob import glob
-from pathlib import PurePath
 
-from typing import List, Optional, Any
+from typing import List, Optional
 
 sys.path.insert(0, os.getcwd())
-from pegen.build import build_c_parser_and_generator
+from pegen.batch import find_files, parse_files
+from pegen.build import build_parser, build_python_generator
 from tests.utils import print_memstats
 from scripts import show_parse
 
@@ -43,6 +43,9 @@ argparser.add_argument(
 argparser.add_argument(
     "-t", "--tree", action="count", help="Compare parse tree to official AST", default=0
 )
+argparser.add_argument(
+    "-j", "--jobs", type=int, help="Number of worker processes (default: the number of CPUs)"
+)
 
 
 def report_status(
@@ -123,26 +126,23 @@ def parse_directory(
     skip_actions: bool,
     tree_arg: int,
     short: bool,
-    extension: Any,
+    jobs: Optional[int] = None,
 ) -> int:
     if not directory:
         print("You must specify a directory of files to test.", file=sys.stderr)
         return 1
 
-    if grammar_file:
-        if not os.path.exists(grammar_file):
-            print(f"The specified grammar file, {grammar_file}, does not exist.", file=sys.stderr)
-            return 1
+    if not grammar_file or not os.path.exists(grammar_file):
+        print(f"The specified grammar file, {grammar_file}, does not exist.", file=sys.stderr)
+        return 1
 
+    with tempfile.TemporaryDirectory() as tmpdir:
+        module_path = os.path.join(tmpdir, "parse.py")
         try:
-            if not extension:
-                build_c_parser_and_generator(
-                    grammar_file,
-                    "data/Tokens",  # TODO: Don't hardcode this
-                    "peg_extension/parse.c",
-                    compile_extension=True,
-                    skip_actions=skip_actions,
-                )
+            grammar, _, _ = build_parser(grammar_file)
+            build_python_generator(
+                grammar, grammar_file, module_path, skip_actions=skip_actions
+            )
         except Exception as err:
             print(
                 f"{FAIL}The following error occurred when generating the parser. Please check your grammar file.\n{ENDC}",
@@ -152,55 +152,33 @@ def parse_directory(
 
             return 1
 
-    else:
-        print("A grammar file was not provided - attempting to use existing file...\n")
-
-    try:
-        from peg_extension import parse  # type: ignore
-    except:
-        print(
-            "An existing parser was not found. Please run `make` or specify a grammar file with the `-g` flag.",
-            file=sys.stderr,
-        )
-        return 1
+        # For a given directory, parse the files in worker processes
+        # - Output success/failure for each file
+        errors = 0
+        files = find_files([directory], exclude=excluded_files)
+        trees = {}  # Trees to compare (after everything else is done)
 
-    # For a given directory, traverse files and attempt to parse each one
-    # - Output success/failure for each file
-    errors = 0
-    files = []
-    trees = {}  # Trees to compare (after everything else is done)
-
-    t0 = time.time()
-    for file in sorted(glob(f"{directory}/**/*.py", recursive=True)):
-        # Only attempt to parse Python files and files that are not excluded
-        should_exclude_file = False
-        for pattern in excluded_files:
-            if PurePath(file).match(pattern):
-                should_exclude_file = True
-                break
-
-        if not should_exclude_file:
-            try:
+        t0 = time.time()
+        for result in parse_files(module_path, files, jobs, trees=bool(tree_arg)):
+            file = result.filename
+            if result.error is None:
                 if tree_arg:
-                    tree = parse.parse_file(file, mode=1)
-                    trees[file] = tree
-                else:
-                    parse.parse_file(file, mode=0)
+                    trees[file] = result.tree
                 if not short:
                     report_status(succeeded=True, file=file, verbose=verbose)
-            except Exception as error:
+            else:
                 try:
-                    ast.parse(file)
+                    with open(file) as f:
+                        ast.parse(f.read())
                 except Exception:
                     if not short:
                         print(f"File {file} cannot be parsed by either pegen or the ast module.")
                 else:
                     report_status(
-                        succeeded=False, file=file, verbose=verbose, error=error, short=short
+                        succeeded=False, file=file, verbose=verbose, error=result.error, short=short
                     )
                     errors += 1
-            files.append(file)
-    t1 = time.time()
+        t1 = time.time()
 
     total_seconds = t1 - t0
     total_files = len(files)
@@ -223,12 +201,6 @@ def parse_directory(
             f"or {total_bytes / total_seconds :,.0f} bytes/sec.",
         )
 
-    # Dump memo stats to @data.
-    with open("@data", "w") as datafile:
-        for i, count in enumerate(parse.get_memo_stats()):
-            if count:
-                datafile.write(f"{i:4d} {count:9d}\n")
-
     if short:
         print_memstats()
 
@@ -258,9 +230,10 @@ def main() -> None:
     skip_actions = args.skip_actions
     tree = args.tree
     short = args.short
+    jobs = args.jobs
     sys.exit(
         parse_directory(
-            directory, grammar_file, verbose, excluded_files, skip_actions, tree, short, None
+            directory, grammar_file, verbose, excluded_files, skip_actions, tree, short, jobs
         )
     )
 
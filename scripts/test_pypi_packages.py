@@ -8,10 +8,9 @@ import zipfile
 import shutil
 import sys
 
-from typing import Generator, Any
+from typing import Generator, Optional
 
 sys.path.insert(0, ".")
-from pegen import build
 from scripts import test_parse_directory
 
 argparser = argparse.ArgumentParser(
@@ -21,6 +20,9 @@ argparser = argparse.ArgumentParser(
 argparser.add_argument(
     "-t", "--tree", action="count", help="Compare parse tree to official AST", default=0
 )
+argparser.add_argument(
+    "-j", "--jobs", type=int, help="Number of worker processes (default: the number of CPUs)"
+)
 
 
 def get_packages() -> Generator[str, None, None]:
@@ -51,7 +53,7 @@ def find_dirname(package_name: str) -> str:
     assert False  # This is to fix mypy, should never be reached
 
 
-def run_tests(dirname: str, tree: int, extension: Any) -> int:
+def run_tests(dirname: str, tree: int, jobs: Optional[int]) -> int:
     return test_parse_directory.parse_directory(
         dirname,
         "data/python.gram",
@@ -68,17 +70,15 @@ def run_tests(dirname: str, tree: int, extension: Any) -> int:
         skip_actions=False,
         tree_arg=tree,
         short=True,
-        extension=extension,
+        jobs=jobs,
     )
 
 
 def main() -> None:
     args = argparser.parse_args()
     tree = args.tree
+    jobs = args.jobs
 
-    extension = build.build_c_parser_and_generator(
-        "data/python.gram", "data/Tokens", "pegen/parse.c", compile_extension=True
-    )
     for package in get_packages():
         print(f"Extracting files from {package}... ", end="")
         try:
@@ -90,7 +90,7 @@ def main() -> None:
 
         print(f"Trying to parse all python files ... ")
         dirname = find_dirname(package)
-        status = run_tests(dirname, tree, extension)
+        status = run_tests(dirname, tree, jobs)
         if status == 0:
             print("Done")
             shutil.rmtree(dirname)
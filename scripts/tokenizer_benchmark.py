@@ -0,0 +1,88 @@
+#!/usr/bin/env python3.8
+
+"""Compare the throughput of the token sources a Tokenizer can use.
+
+Example:
+
+$ python -m scripts.tokenizer_benchmark data/xl.txt $(find src -name '*.py')
+
+Each file is tokenized --repeat times with tokenize.generate_tokens()
+(reading lines from a StringIO, as pegen used to) and with
+pegen.tokenizer.generate_source_tokens(), and the best total times are
+printed.  Both sources must produce the same tokens once Tokenizer has
+dropped the ones it skips; files where they differ are reported.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import token
+import tokenize
+from typing import Callable, Iterator, List
+
+sys.path.insert(0, os.getcwd())
+from pegen.tokenizer import generate_source_tokens
+
+argparser = argparse.ArgumentParser(
+    prog="tokenizer_benchmark", description="Benchmark the token sources of pegen"
+)
+argparser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs")
+argparser.add_argument("files", nargs="+", help="Input files to tokenize")
+
+TokenSource = Callable[[str], Iterator[tokenize.TokenInfo]]
+
+
+def stdlib_tokens(source: str) -> Iterator[tokenize.TokenInfo]:
+    return tokenize.generate_tokens(io.StringIO(source).readline)
+
+
+def significant(tokens: Iterator[tokenize.TokenInfo]) -> List[tokenize.TokenInfo]:
+    """Drop the tokens skipped by Tokenizer."""
+    return [
+        tok
+        for tok in tokens
+        if tok.type not in (tokenize.NL, tokenize.COMMENT)
+        and not (tok.type == token.ERRORTOKEN and tok.string.isspace())
+    ]
+
+
+def time_source(tokens: TokenSource, sources: List[str], repeat: int) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for source in sources:
+            for _ in tokens(source):
+                pass
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    args = argparser.parse_args()
+    sources: List[str] = []
+    ntokens = 0
+    for filename in args.files:
+        with open(filename) as file:
+            source = file.read()
+        try:
+            expected = significant(stdlib_tokens(source))
+        except (SyntaxError, tokenize.TokenError) as err:
+            print(f"{filename}: skipped ({err.__class__.__name__})", file=sys.stderr)
+            continue
+        if list(generate_source_tokens(source)) != expected:
+            print(f"{filename}: token streams differ", file=sys.stderr)
+        sources.append(source)
+        ntokens += len(expected)
+    print(f"{len(sources)} files, {ntokens} tokens")
+    for name, tokens in [
+        ("tokenize.generate_tokens", stdlib_tokens),
+        ("generate_source_tokens", generate_source_tokens),
+    ]:
+        best = time_source(tokens, sources, args.repeat)
+        print(f"{name:30} {best:8.3f} sec  {ntokens / best:12.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,25 @@ Search the web for PEG Parsers for reference.
 """
 
 import argparse
+import os
 import sys
+import tempfile
 import time
 import token
 import traceback
 from typing import Tuple
 
+from pegen.batch import find_files, parse_files
 from pegen.build import (
     Grammar,
     Parser,
     ParserGenerator,
     Tokenizer,
+    build_parser,
+    build_python_generator,
     build_python_parser_and_generator,
 )
+from pegen.build_cache import BuildCache
 from pegen.validator import validate_grammar
 
 
@@ -36,6 +42,13 @@ def generate_python_code(
             verbose_tokenizer,
             verbose_parser,
             skip_actions=args.skip_actions,
+            memoize_all=args.memoize == "all",
+            memo_plan_file=args.memo_plan,
+            prune=args.prune,
+            inline_memo=args.inline_memo,
+            first_set_guards=args.first_set_guards,
+            optimize=args.optimize,
+            left_factor=args.left_factor,
         )
         return grammar, parser, tokenizer, gen
     except Exception as err:
@@ -47,10 +60,21 @@ def generate_python_code(
 
 
 argparser = argparse.ArgumentParser(
-    prog="pegen", description="Experimental PEG-like parser generator"
+    prog="pegen",
+    description="Experimental PEG-like parser generator",
+    epilog="Without a command, pegen runs the generate command.",
 )
-argparser.add_argument("-q", "--quiet", action="store_true", help="Don't print the parsed grammar")
-argparser.add_argument(
+subparsers = argparser.add_subparsers(dest="command", metavar="COMMAND")
+
+generate_argparser = subparsers.add_parser(
+    "generate",
+    help="Generate a Python parser from a grammar (the default)",
+    description="Generate a Python parser from a grammar",
+)
+generate_argparser.add_argument(
+    "-q", "--quiet", action="store_true", help="Don't print the parsed grammar"
+)
+generate_argparser.add_argument(
     "-v",
     "--verbose",
     action="count",
@@ -58,24 +82,132 @@ argparser.add_argument(
     help="Print timing stats; repeat for more debug output",
 )
 
-argparser.add_argument("grammar_filename", help="Grammar description")
-argparser.add_argument(
+generate_argparser.add_argument("grammar_filename", help="Grammar description")
+generate_argparser.add_argument(
     "-o",
     "--output",
     metavar="OUT",
     default="parse.py",
     help="Where to write the generated parser",
 )
-argparser.add_argument(
+generate_argparser.add_argument(
     "--skip-actions",
     action="store_true",
-    help="Suppress code emission for rule actions",
+    help="Generate a recognizer, whose rules return True instead of running their actions",
+)
+generate_argparser.add_argument(
+    "--memoize",
+    choices=["all", "flagged"],
+    default="all",
+    help="Memoize all rules (default) or only those flagged with (memo)",
+)
+generate_argparser.add_argument(
+    "--memo-plan",
+    metavar="PLAN",
+    help="Memoize only the rules listed in this memo plan (see scripts/memo_plan.py)",
+)
+generate_argparser.add_argument(
+    "--prune",
+    action="store_true",
+    help="Discard memo entries and tokens that cuts and top-level statements make unreachable",
+)
+generate_argparser.add_argument(
+    "--inline-memo",
+    action="store_true",
+    help="Inline memo table lookups in the generated rule methods",
+)
+generate_argparser.add_argument(
+    "--first-set-guards",
+    action="store_true",
+    help="Skip alternatives whose FIRST set does not contain the next token",
+)
+generate_argparser.add_argument(
+    "--optimize",
+    action="store_true",
+    help="Inline small rules and drop unreachable ones before generating the parser",
+)
+generate_argparser.add_argument(
+    "--left-factor",
+    action="store_true",
+    help="Parse the leading items shared by consecutive alternatives once",
 )
 
 
-def main() -> None:
-    args = argparser.parse_args()
+parse_argparser = subparsers.add_parser(
+    "parse",
+    help="Parse files with a generated Python parser",
+    description="Parse files with a generated Python parser",
+)
+parse_argparser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of worker processes (default: the number of CPUs)",
+)
+parse_argparser.add_argument(
+    "--chunksize", type=int, default=None, help="Number of files sent to a worker at a time"
+)
+parse_argparser.add_argument(
+    "-p",
+    "--pattern",
+    default="*.py",
+    help="Glob for the files to parse in directories (default: *.py)",
+)
+parse_argparser.add_argument(
+    "-e", "--exclude", action="append", default=[], help="Glob(s) for matching files to exclude"
+)
+parse_argparser.add_argument("-q", "--quiet", action="store_true", help="Only report failures")
+parse_argparser.add_argument(
+    "--build-cache", metavar="DIR", help="Reuse the parser generated from the grammar in DIR"
+)
+parse_argparser.add_argument(
+    "--skip-actions",
+    action="store_true",
+    help="Only check that the files parse, without running the grammar actions",
+)
+parse_argparser.add_argument(
+    "grammar", help="Grammar file, or Python parser module generated from one"
+)
+parse_argparser.add_argument("paths", nargs="+", help="Files and directories to parse")
+
 
+def parse_main(args: argparse.Namespace) -> int:
+    files = find_files(args.paths, args.pattern, args.exclude)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.grammar.endswith(".py"):
+            module_path = args.grammar
+        elif args.build_cache:
+            module_path = BuildCache(args.build_cache).build(
+                args.grammar, skip_actions=args.skip_actions
+            )
+        else:
+            module_path = os.path.join(tmpdir, "parse.py")
+            grammar, _, _ = build_parser(args.grammar)
+            build_python_generator(
+                grammar, args.grammar, module_path, skip_actions=args.skip_actions
+            )
+        failures = 0
+        t0 = time.time()
+        for result in parse_files(module_path, files, args.jobs, args.chunksize):
+            error = result.error
+            if error is None:
+                if not args.quiet:
+                    print(f"{result.filename}: OK")
+                continue
+            failures += 1
+            if isinstance(error, SyntaxError):
+                lineno = error.lineno or 1
+                offset = error.offset or 1
+                print(f"{result.filename}:{lineno}:{offset}: {error.args[0]}")
+            else:
+                print(f"{result.filename}: {error.__class__.__name__}: {error}")
+        dt = time.time() - t0
+    print(f"Parsed {len(files)} files in {dt:.3f} sec; {failures} failures", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def generate_main(args: argparse.Namespace) -> int:
     t0 = time.time()
     grammar, parser, tokenizer, gen = generate_python_code(args)
     t1 = time.time()
@@ -124,7 +256,20 @@ def main() -> None:
             print()
         print("Caches sizes:")
         print(f"  token array : {len(tokenizer._tokens):10}")
-        print(f"        cache : {len(parser._cache):10}")
+        print(f"        cache : {parser.memo_size():10}")
+    return 0
+
+
+generate_argparser.set_defaults(func=generate_main)
+parse_argparser.set_defaults(func=parse_main)
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in subparsers.choices and argv[0] not in ("-h", "--help"):
+        argv = ["generate", *argv]  # Generating was the only command at first.
+    args = argparser.parse_args(argv)
+    sys.exit(args.func(args))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+"""Tokenizing and parsing input that arrives over asyncio streams.
+
+The parser itself stays synchronous: AsyncTokenizer reads ahead until
+the next statement at indentation 0 has arrived, then a top-level item
+is parsed from the buffered tokens.  If the parser needs a token that
+has not arrived yet, the item is parsed again once more input is read.
+Items of more than yield_every tokens are parsed in an executor (a
+thread pool by default), so that the event loop keeps running.
+
+Usage:
+
+    reader, writer = await asyncio.open_connection(host, port)
+    parser = GeneratedParser(AsyncTokenizer(reader))
+    async for tree in stream_async(parser, "stmt"):
+        ...
+"""
+
+import asyncio
+import codecs
+import collections
+import concurrent.futures
+import io
+import token
+import tokenize
+from typing import Any, AsyncIterator, Callable, Deque, Iterator, Optional, Union
+
+from pegen.parser import Parser
+from pegen.tokenizer import Tokenizer, _generate_tokens
+
+# Bytes read from a StreamReader at a time.
+CHUNK_SIZE = 65536
+
+
+class _InputPending(Exception):
+    """Raised when the parser needs a token that has not arrived yet."""
+
+
+class _TokenFeed:
+    """The tokens of the lines read so far, as an iterator for Tokenizer.
+
+    Unlike a generator, it can raise _InputPending and be resumed.
+    """
+
+    def __init__(self, tokenizer: "AsyncTokenizer"):
+        self._tokengen = _generate_tokens(tokenizer._read_lines())
+
+    def __iter__(self) -> "_TokenFeed":
+        return self
+
+    def __next__(self) -> tokenize.TokenInfo:
+        tok = next(self._tokengen)
+        if tok is None:
+            raise _InputPending
+        return tok
+
+
+async def _read_chunks(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await reader.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class AsyncTokenizer(Tokenizer):
+    """Tokenizer reading bytes from a StreamReader or an async iterator.
+
+    The encoding is detected like tokenize.tokenize() does, unless one
+    is given.  The tokenizer gives control back to the event loop every
+    yield_every tokens it reads ahead.
+    """
+
+    def __init__(
+        self,
+        source: Union[asyncio.StreamReader, AsyncIterator[bytes]],
+        *,
+        encoding: Optional[str] = None,
+        yield_every: int = 1000,
+        verbose: bool = False,
+    ):
+        if isinstance(source, asyncio.StreamReader):
+            source = _read_chunks(source)
+        self._chunks = source
+        self._encoding = encoding
+        self._decoder: Optional[codecs.IncrementalDecoder] = None
+        self._undecoded = b""
+        # Complete lines not tokenized yet, and the start of the next one.
+        self._lines: Deque[str] = collections.deque()
+        self._partial = ""
+        self._eof = False
+        self.yield_every = yield_every
+        self._unyielded = 0
+        # Buffered tokens before this one were checked for a statement start.
+        self._scanned = 0
+        super().__init__(_TokenFeed(self), verbose=verbose)
+
+    def _read_lines(self) -> Iterator[Optional[str]]:
+        lines = self._lines
+        while True:
+            if lines:
+                yield lines.popleft()
+            elif self._eof:
+                yield ""
+                return
+            else:
+                yield None
+
+    async def _read(self) -> None:
+        """Read a chunk of input, or the end of input."""
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            chunk = b""
+        if self._decoder is None:
+            self._undecoded += chunk
+            if chunk and self._undecoded.count(b"\n") < 2:
+                return  # The encoding can be declared on the second line.
+            encoding = self._encoding
+            if encoding is None:
+                encoding, _ = tokenize.detect_encoding(io.BytesIO(self._undecoded).readline)
+            self._decoder = codecs.getincrementaldecoder(encoding)()
+            chunk, self._undecoded = self._undecoded, b""
+        text = self._partial + self._decoder.decode(chunk, final=not chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        self._lines.extend(line + "\n" for line in lines)
+        if not chunk:
+            if self._partial:
+                self._lines.append(self._partial)
+            self._eof = True
+
+    async def _fetch(self) -> bool:
+        """Tokenize one more token, reading input as needed.
+
+        Returns False if all the tokens have been read.
+        """
+        tokens = self._tokens
+        if tokens and tokens[-1].type == token.ENDMARKER:
+            return False
+        while True:
+            try:
+                tokens.append(next(self._tokengen))
+                break
+            except _InputPending:
+                await self._read()
+        self._unyielded += 1
+        if self._unyielded >= self.yield_every:
+            self._unyielded = 0
+            await asyncio.sleep(0)
+        return True
+
+    async def read_statement(self) -> None:
+        """Read ahead up to the next statement at indentation 0.
+
+        That is, until the first token of a top-level statement after
+        the current token has arrived, or all the tokens have.
+        """
+        tokens = self._tokens
+        self._scanned = max(self._scanned, self._index + 1)
+        while True:
+            while self._scanned < len(tokens):
+                tok = tokens[self._scanned]
+                self._scanned += 1
+                if (
+                    tok.start[1] == 0
+                    and tok.type not in (token.INDENT, token.DEDENT)
+                    and tokens[self._scanned - 2].type in (token.NEWLINE, token.DEDENT)
+                ):
+                    return
+            if not await self._fetch():
+                return
+
+    async def read_more(self) -> None:
+        """Read ahead at least one more token, unless all have been read."""
+        await self._fetch()
+
+    async def read_all(self) -> None:
+        """Read all the tokens."""
+        while await self._fetch():
+            pass
+
+    def rebase(self, mark: int) -> None:
+        count = max(mark - 1, 0)
+        super().rebase(mark)
+        self._scanned = max(self._scanned - count, 0)
+
+
+async def _run(
+    method: Callable[[], Any],
+    tokenizer: AsyncTokenizer,
+    executor: Optional[concurrent.futures.Executor],
+) -> Any:
+    """Call a rule method, in executor if it has more than yield_every tokens to parse."""
+    if len(tokenizer._tokens) - tokenizer._index < tokenizer.yield_every:
+        return method()
+    # The parser is only used by one thread at a time, as this waits.
+    return await asyncio.get_running_loop().run_in_executor(executor, method)
+
+
+async def stream_async(
+    parser: Parser,
+    rule: str,
+    filename: str = "<unknown>",
+    executor: Optional[concurrent.futures.Executor] = None,
+) -> AsyncIterator[Any]:
+    """Like Parser.stream(), for a parser using an AsyncTokenizer.
+
+    The event loop runs while input is awaited, every yield_every tokens
+    read, and between items.  An item is parsed once its input has
+    arrived, in executor (or the loop's default one) if it has more than
+    yield_every tokens.  executor must run the parse in this process.
+    """
+    tokenizer = parser._tokenizer
+    assert isinstance(tokenizer, AsyncTokenizer)
+    method = getattr(parser, rule)
+    while True:
+        await tokenizer.read_statement()
+        mark = parser.mark()
+        try:
+            if tokenizer.peek().type == token.ENDMARKER:
+                return
+            tree = await _run(method, tokenizer, executor)
+        except _InputPending:
+            # Memo entries may be partial (see memoize_left_rec()), so
+            # parse the item again from scratch.
+            parser._memo.clear()
+            parser._level = 0
+            parser.reset(mark)
+            await tokenizer.read_more()
+            continue
+        if not tree or parser.mark() == mark:
+            raise parser.make_syntax_error(filename)
+        yield tree
+        parser._memo.clear()
+        parser._pruned = 0
+        tokenizer.rebase(parser.mark())
+        await asyncio.sleep(0)
+
+
+async def parse_async(
+    parser: Parser, rule: str = "start", executor: Optional[concurrent.futures.Executor] = None
+) -> Any:
+    """Read all the input of a parser using an AsyncTokenizer, then parse it.
+
+    As in stream_async(), an input of more than yield_every tokens is
+    parsed in executor.  stream_async() keeps less input in memory for
+    long inputs made of many top-level items.
+    """
+    tokenizer = parser._tokenizer
+    assert isinstance(tokenizer, AsyncTokenizer)
+    await tokenizer.read_all()
+    return await _run(getattr(parser, rule), tokenizer, executor)
@@ -0,0 +1,150 @@
+"""Parsing many files in parallel with a generated Python parser.
+
+Worker processes import the generated parser from its module file, so
+the parser class never needs to be pickled.  Results come back in the
+order of the files, as soon as they are available.
+
+Usage:
+
+    for result in parse_files("parse.py", find_files(["src"]), jobs=4):
+        if result.error is not None:
+            print(result.filename, result.error)
+"""
+
+import concurrent.futures
+import fnmatch
+import importlib.util
+import os
+import tokenize
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Type
+
+from pegen.parser import Parser
+from pegen.token_cache import TokenCache
+from pegen.tokenizer import Tokenizer, generate_line_tokens, generate_source_tokens, read_source
+
+
+class ParseResult(NamedTuple):
+    filename: str
+    # None if the file failed to parse, or if trees were not requested.
+    tree: Any
+    error: Optional[Exception]
+
+
+def load_parser_class(module_path: str) -> Type[Parser]:
+    """Import a generated parser module from its path; return its GeneratedParser."""
+    name = os.path.splitext(os.path.basename(module_path))[0]
+    spec = importlib.util.spec_from_file_location(name, module_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot import a parser from {module_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    parser_class: Type[Parser] = module.GeneratedParser
+    return parser_class
+
+
+def parse_file(
+    parser_class: Type[Parser],
+    filename: str,
+    tokenizer_class: Type[Tokenizer] = Tokenizer,
+    token_cache: Optional[TokenCache] = None,
+    stream: Optional[str] = None,
+) -> Any:
+    """Parse a file, raising a SyntaxError if it does not parse.
+
+    Tokens come from token_cache if it is given.  If stream is given, the
+    file is read line by line and parsed as a sequence of the rule stream
+    (see Parser.stream()), and the number of items parsed is returned.
+    """
+    if stream is not None:
+        with tokenize.open(filename) as text:
+            parser = parser_class(tokenizer_class(generate_line_tokens(text.readline)))
+            return sum(1 for _ in parser.stream(stream, filename))
+    with open(filename, "rb") as file:
+        source = read_source(file)
+    if token_cache is not None:
+        tokengen = token_cache.generate_tokens(source)
+    else:
+        tokengen = generate_source_tokens(source)
+    parser = parser_class(tokenizer_class(tokengen))
+    tree = parser.start()
+    if not tree:
+        raise parser.make_syntax_error(filename)
+    return tree
+
+
+def find_files(
+    paths: Iterable[str], pattern: str = "*.py", exclude: Sequence[str] = ()
+) -> List[str]:
+    """Return the files given, and those matching pattern in the directories given.
+
+    Files matching one of the exclude patterns are left out.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                files.extend(
+                    os.path.join(dirpath, name)
+                    for name in sorted(filenames)
+                    if fnmatch.fnmatch(name, pattern)
+                )
+        else:
+            files.append(path)
+    return [file for file in files if not any(fnmatch.fnmatch(file, glob) for glob in exclude)]
+
+
+def _parse(parser_class: Type[Parser], filename: str, keep_tree: bool) -> ParseResult:
+    try:
+        tree = parse_file(parser_class, filename)
+    except Exception as error:
+        return ParseResult(filename, None, error)
+    return ParseResult(filename, tree if keep_tree else None, None)
+
+
+# The state of a worker process (see _init_worker()).
+_parser_class: Optional[Type[Parser]] = None
+_keep_trees = False
+
+
+def _init_worker(module_path: str, keep_trees: bool) -> None:
+    global _parser_class, _keep_trees
+    _parser_class = load_parser_class(module_path)
+    _keep_trees = keep_trees
+
+
+def _parse_in_worker(filename: str) -> ParseResult:
+    assert _parser_class is not None
+    return _parse(_parser_class, filename, _keep_trees)
+
+
+def parse_files(
+    module_path: str,
+    filenames: Iterable[str],
+    jobs: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    trees: bool = False,
+) -> Iterator[ParseResult]:
+    """Parse files with the parser generated in module_path, in jobs processes.
+
+    Results are yielded in the order of the files.  Errors are returned
+    rather than raised.  Trees are sent back only if trees is true (they
+    must be picklable then).  jobs defaults to the number of CPUs, and
+    files are sent to the workers chunksize at a time.
+    """
+    filenames = list(filenames)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1 or len(filenames) <= 1:
+        parser_class = load_parser_class(module_path)
+        for filename in filenames:
+            yield _parse(parser_class, filename, trees)
+        return
+    if chunksize is None:
+        # Large enough to make messages rare, small enough that every
+        # worker gets several chunks to balance the load.
+        chunksize = max(1, min(32, len(filenames) // (jobs * 4)))
+    with concurrent.futures.ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(module_path, trees)
+    ) as executor:
+        yield from executor.map(_parse_in_worker, filenames, chunksize=chunksize)
@@ -1,14 +1,13 @@
 import pathlib
 import sysconfig
-import tokenize
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from pegen.grammar import Grammar
 from pegen.grammar_parser import GeneratedParser as GrammarParser
-from pegen.parser import Parser
+from pegen.parser import Parser, read_memo_plan
 from pegen.parser_generator import ParserGenerator
 from pegen.python_generator import PythonParserGenerator
-from pegen.tokenizer import Tokenizer
+from pegen.tokenizer import Tokenizer, generate_source_tokens, read_source
 
 MOD_DIR = pathlib.Path(__file__).resolve().parent
 
@@ -18,8 +17,8 @@ TokenDefinitions = Tuple[Dict[int, str], Dict[str, int], Set[str]]
 def build_parser(
     grammar_file: str, verbose_tokenizer: bool = False, verbose_parser: bool = False
 ) -> Tuple[Grammar, Parser, Tokenizer]:
-    with open(grammar_file) as file:
-        tokenizer = Tokenizer(tokenize.generate_tokens(file.readline), verbose=verbose_tokenizer)
+    with open(grammar_file, "rb") as file:
+        tokenizer = Tokenizer(generate_source_tokens(read_source(file)), verbose=verbose_tokenizer)
         parser = GrammarParser(tokenizer, verbose=verbose_parser)
         grammar = parser.start()
 
@@ -34,9 +33,31 @@ def build_python_generator(
     grammar_file: str,
     output_file: str,
     skip_actions: bool = False,
+    memoize_all: bool = True,
+    memo_plan_file: Optional[str] = None,
+    prune: bool = False,
+    inline_memo: bool = False,
+    first_set_guards: bool = False,
+    optimize: bool = False,
+    left_factor: bool = False,
 ) -> ParserGenerator:
+    memo_plan = None
+    if memo_plan_file is not None:
+        with open(memo_plan_file) as file:
+            memo_plan = read_memo_plan(file)
     with open(output_file, "w") as file:
-        gen: ParserGenerator = PythonParserGenerator(grammar, file)  # TODO: skip_actions
+        gen: ParserGenerator = PythonParserGenerator(
+            grammar,
+            file,
+            memoize_all=memoize_all,
+            memo_plan=memo_plan,
+            prune=prune,
+            inline_memo=inline_memo,
+            first_set_guards=first_set_guards,
+            optimize=optimize,
+            left_factor=left_factor,
+            skip_actions=skip_actions,
+        )
         gen.generate(grammar_file)
     return gen
 
@@ -47,6 +68,13 @@ def build_python_parser_and_generator(
     verbose_tokenizer: bool = False,
     verbose_parser: bool = False,
     skip_actions: bool = False,
+    memoize_all: bool = True,
+    memo_plan_file: Optional[str] = None,
+    prune: bool = False,
+    inline_memo: bool = False,
+    first_set_guards: bool = False,
+    optimize: bool = False,
+    left_factor: bool = False,
 ) -> Tuple[Grammar, Parser, Tokenizer, ParserGenerator]:
     """Generate rules, python parser, tokenizer, parser generator for a given grammar
 
@@ -57,7 +85,28 @@ def build_python_parser_and_generator(
           when generating the tokenizer. Defaults to False.
         verbose_parser (bool, optional): Whether to display additional output
           when generating the parser. Defaults to False.
-        skip_actions (bool, optional): Whether to pretend no rule has any actions.
+        skip_actions (bool, optional): Whether to generate a recognizer, whose rules
+          return True instead of evaluating their actions. Defaults to False.
+        memoize_all (bool, optional): Whether to memoize every rule, or only the
+          rules flagged with (memo) and left-recursion leaders. Defaults to True.
+        memo_plan_file (string, optional): Path of a memo plan listing the rules
+          to memoize, overriding memoize_all. Left-recursion leaders are always
+          memoized.
+        prune (bool, optional): Whether the generated parser should discard memo
+          entries after cuts, and memo entries and tokens between top-level
+          statements. Defaults to False.
+        inline_memo (bool, optional): Whether to inline the memo table lookups
+          in the generated rule methods instead of using decorators.
+          Defaults to False.
+        first_set_guards (bool, optional): Whether the generated parser should
+          skip alternatives and helper rules that cannot start with the next
+          token. Defaults to False.
+        optimize (bool, optional): Whether to inline rules and drop unreachable
+          ones before generating the parser (see pegen.optimizer).
+          Defaults to False.
+        left_factor (bool, optional): Whether the generated parser should parse
+          the leading items shared by consecutive alternatives once.
+          Defaults to False.
     """
     grammar, parser, tokenizer = build_parser(grammar_file, verbose_tokenizer, verbose_parser)
     gen = build_python_generator(
@@ -65,5 +114,12 @@ def build_python_parser_and_generator(
         grammar_file,
         output_file,
         skip_actions=skip_actions,
+        memoize_all=memoize_all,
+        memo_plan_file=memo_plan_file,
+        prune=prune,
+        inline_memo=inline_memo,
+        first_set_guards=first_set_guards,
+        optimize=optimize,
+        left_factor=left_factor,
     )
     return grammar, parser, tokenizer, gen
@@ -0,0 +1,172 @@
+"""A cache of generated Python parsers, keyed by grammar content.
+
+BuildCache stores parser modules in a directory, named after a hash of
+the grammar, the generator options and the pegen sources.  On a hit
+nothing is generated: the module is imported from its byte-compiled
+file.  make_parser_class() keeps the parser classes it generates from
+grammar strings in memory.
+
+Usage:
+
+    cache = BuildCache(".pegen-build")
+    parser_class = cache.load_parser_class("data/python.gram", prune=True)
+"""
+
+import functools
+import hashlib
+import io
+import os
+import py_compile
+import sys
+import tempfile
+from typing import Any, Dict, Optional, Type
+
+from pegen.batch import load_parser_class
+from pegen.build import MOD_DIR, build_python_generator
+from pegen.grammar import Grammar
+from pegen.grammar_parser import GeneratedParser as GrammarParser
+from pegen.parser import Parser
+from pegen.python_generator import PythonParserGenerator
+from pegen.tokenizer import Tokenizer, generate_source_tokens, read_source
+
+# Bump when the layout of the cache directory changes.
+FORMAT_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def generator_fingerprint() -> str:
+    """Return a hash of the pegen sources, which determine the generated code."""
+    digest = hashlib.blake2b(digest_size=20)
+    for path in sorted(MOD_DIR.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def parse_grammar(source: str, filename: str = "<string>") -> Grammar:
+    """Parse a grammar from a string, raising a SyntaxError on failure."""
+    parser = GrammarParser(Tokenizer(generate_source_tokens(source)))
+    grammar = parser.start()
+    if not grammar:
+        raise parser.make_syntax_error(filename)
+    return grammar
+
+
+class BuildCache:
+    """Generated parser modules stored in a directory.
+
+    Like TokenCache, several processes can share a directory: modules
+    are written under a temporary name and renamed into place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, grammar_source: str, filename: str, **options: Any) -> str:
+        """Return the module path for a grammar and generator options.
+
+        filename is the name the generated module mentions in its header.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{FORMAT_VERSION} {sys.version_info[:2]}\n".encode())
+        digest.update(f"{generator_fingerprint()} {filename}\n".encode())
+        digest.update(f"{sorted(options.items())!r}\n".encode())
+        digest.update(grammar_source.encode("utf-8", "surrogatepass"))
+        return os.path.join(self.directory, "parser_" + digest.hexdigest() + ".py")
+
+    def build(
+        self,
+        grammar_file: str,
+        skip_actions: bool = False,
+        memoize_all: bool = True,
+        memo_plan_file: Optional[str] = None,
+        prune: bool = False,
+        inline_memo: bool = False,
+        first_set_guards: bool = False,
+        optimize: bool = False,
+        left_factor: bool = False,
+    ) -> str:
+        """Return the path of the parser module generated from grammar_file.
+
+        The options are those of build_python_generator().  The module is
+        only generated (and byte-compiled) on a miss.
+        """
+        with open(grammar_file, "rb") as file:
+            grammar_source = read_source(file)
+        memo_plan = None
+        if memo_plan_file is not None:
+            with open(memo_plan_file) as file:
+                memo_plan = file.read()
+        filename = os.path.basename(grammar_file)
+        path = self.path(
+            grammar_source,
+            filename,
+            skip_actions=skip_actions,
+            memoize_all=memoize_all,
+            memo_plan=memo_plan,
+            prune=prune,
+            inline_memo=inline_memo,
+            first_set_guards=first_set_guards,
+            optimize=optimize,
+            left_factor=left_factor,
+        )
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        grammar = parse_grammar(grammar_source, grammar_file)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            build_python_generator(
+                grammar,
+                filename,
+                temp_path,
+                skip_actions=skip_actions,
+                memoize_all=memoize_all,
+                memo_plan_file=memo_plan_file,
+                prune=prune,
+                inline_memo=inline_memo,
+                first_set_guards=first_set_guards,
+                optimize=optimize,
+                left_factor=left_factor,
+            )
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        py_compile.compile(path, doraise=True)
+        return path
+
+    def load_parser_class(self, grammar_file: str, **options: Any) -> Type[Parser]:
+        """Return the GeneratedParser class for grammar_file (see build())."""
+        return load_parser_class(self.build(grammar_file, **options))
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate)"
+
+
+@functools.lru_cache(maxsize=128)
+def make_parser_class(
+    grammar_source: str, filename: str = "<string>", **options: Any
+) -> Type[Parser]:
+    """Generate a parser class from a grammar string, without writing files.
+
+    The options are passed to PythonParserGenerator and must be hashable
+    (use a frozenset for memo_plan).  The most recently used classes are
+    kept, so building the same parser again costs a dictionary lookup.
+    """
+    out = io.StringIO()
+    gen = PythonParserGenerator(parse_grammar(grammar_source, filename), out, **options)
+    gen.generate(filename)
+    ns: Dict[str, Any] = {}
+    exec(compile(out.getvalue(), filename, "exec"), ns)
+    return ns["GeneratedParser"]
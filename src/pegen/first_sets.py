@@ -3,12 +3,12 @@
 import argparse
 import pprint
 import sys
-from typing import Dict, Set
+from typing import AbstractSet, Dict, Optional, Set, Tuple
 
-from pegen.build import build_parser
 from pegen.grammar import (
     Alt,
     Cut,
+    Forced,
     Gather,
     Grammar,
     GrammarVisitor,
@@ -136,7 +136,115 @@ class FirstSetCalculator(GrammarVisitor):
         return self.first_sets[item.name]
 
 
+# A FIRST set usable as a guard: the terminals something must start with,
+# or None if it may start with any token.
+GuardSet = Optional[Set[str]]
+
+
+def _union(first: GuardSet, other: GuardSet) -> GuardSet:
+    if first is None or other is None:
+        return None
+    return first | other
+
+
+class GuardSetCalculator(GrammarVisitor):
+    """Calculate FIRST sets that are safe to use as guards in generated code.
+
+    Unlike the sets of FirstSetCalculator, these are never too small:
+    lookaheads never remove terminals, references the calculator cannot
+    reason about make a set unknown (None), and rule sets are computed as
+    a fixpoint, so they are complete for (mutually) left-recursive rules.
+
+    Visiting a node returns a (first set, nullable) pair.  Terminals are
+    token names (limited to `tokens`) and string literals, spelled as in
+    the grammar.
+    """
+
+    def __init__(self, rules: Dict[str, Rule], tokens: AbstractSet[str]) -> None:
+        self.rules = rules
+        self.tokens = tokens
+        self.first_sets: Dict[str, GuardSet] = {name: set() for name in rules}
+        self.nullables: Dict[str, bool] = {name: False for name in rules}
+        changed = True
+        while changed:
+            changed = False
+            for name, rule in rules.items():
+                first, nullable = self.visit(rule.rhs)
+                if first != self.first_sets[name] or nullable != self.nullables[name]:
+                    self.first_sets[name] = first
+                    self.nullables[name] = nullable
+                    changed = True
+
+    def guard(self, node: object) -> GuardSet:
+        """Return the terminals that any match of node must start with.
+
+        Return None if node may match without consuming a token.
+        """
+        first, nullable = self.visit(node)
+        return None if nullable else first
+
+    def visit_Rhs(self, item: Rhs) -> Tuple[GuardSet, bool]:
+        result: GuardSet = set()
+        nullable = False
+        for alt in item.alts:
+            first, alt_nullable = self.visit(alt)
+            result = _union(result, first)
+            nullable = nullable or alt_nullable
+        return result, nullable
+
+    def visit_Alt(self, item: Alt) -> Tuple[GuardSet, bool]:
+        result: GuardSet = set()
+        for other in item.items:
+            first, nullable = self.visit(other)
+            result = _union(result, first)
+            if not nullable:
+                return result, False
+        return result, True
+
+    def visit_NamedItem(self, item: NamedItem) -> Tuple[GuardSet, bool]:
+        return self.visit(item.item)
+
+    def visit_Group(self, item: Group) -> Tuple[GuardSet, bool]:
+        return self.visit(item.rhs)
+
+    def visit_Opt(self, item: Opt) -> Tuple[GuardSet, bool]:
+        return self.visit(item.node)[0], True
+
+    def visit_Repeat0(self, item: Repeat0) -> Tuple[GuardSet, bool]:
+        return self.visit(item.node)[0], True
+
+    def visit_Repeat1(self, item: Repeat1) -> Tuple[GuardSet, bool]:
+        return self.visit(item.node)
+
+    def visit_Gather(self, item: Gather) -> Tuple[GuardSet, bool]:
+        return self.visit(item.node)
+
+    def visit_PositiveLookahead(self, item: PositiveLookahead) -> Tuple[GuardSet, bool]:
+        return self.visit(item.node)[0], True
+
+    def visit_NegativeLookahead(self, item: NegativeLookahead) -> Tuple[GuardSet, bool]:
+        return set(), True
+
+    def visit_Forced(self, item: Forced) -> Tuple[GuardSet, bool]:
+        return None, True
+
+    def visit_Cut(self, item: Cut) -> Tuple[GuardSet, bool]:
+        return set(), True
+
+    def visit_NameLeaf(self, item: NameLeaf) -> Tuple[GuardSet, bool]:
+        if item.value in self.rules:
+            return self.first_sets[item.value], self.nullables[item.value]
+        if item.value in self.tokens:
+            return {item.value}, False
+        return None, True
+
+    def visit_StringLeaf(self, item: StringLeaf) -> Tuple[GuardSet, bool]:
+        return {item.value}, False
+
+
 def main() -> None:
+    from pegen.build import build_parser
+
     args = argparser.parse_args()
 
     try:
@@ -0,0 +1,294 @@
+"""Optimization passes over a grammar, run before generating a parser.
+
+optimize_grammar() returns an equivalent grammar whose generated parser
+makes fewer calls: parsers built from either return the same trees.
+
+- A rule with a single alternative made of a single item, whose action
+  just returns that item (e.g. `target: t=NAME { t }`), is an alias:
+  its references are replaced by the item.
+- A rule referenced once, from an alternative that just returns it
+  (e.g. `| atom { atom }`), has its alternatives spliced into the
+  referencing rule in place of that alternative.  So has a group in
+  such an alternative (e.g. `| op=('+' | '-') { op }`).  This is only
+  done if none of the spliced alternatives can return a false value
+  (such as None from an action), since the referencing rule would then
+  fail instead of trying its next alternative.  That is, each of them
+  either has no action, or has one returning an item that is not
+  optional.
+- Rules that cannot be reached from the start rule are dropped.
+
+Left-recursive rules, rules flagged with (memo) and the rules listed in
+keep are never inlined, and nothing is spliced into a left-recursive
+rule, since memoization matters there.  Rules with cuts are not spliced
+either, as a cut would then cover the alternatives of the caller.  A
+grammar without a start rule is only optimized by replacing aliases, as
+any of its rules may be called from its trailer.
+"""
+
+from typing import AbstractSet, Dict, List, Optional, Set
+
+from pegen.grammar import (
+    Alt,
+    Cut,
+    Forced,
+    Gather,
+    Grammar,
+    GrammarVisitor,
+    Group,
+    NamedItem,
+    NameLeaf,
+    NegativeLookahead,
+    Opt,
+    PositiveLookahead,
+    Repeat0,
+    Repeat1,
+    Rhs,
+    Rule,
+    StringLeaf,
+)
+from pegen.parser_generator import compute_left_recursives, compute_nullables
+
+
+class RuleReferenceCounter(GrammarVisitor):
+    """Count the references to each rule of a grammar."""
+
+    def __init__(self, rules: Dict[str, Rule]):
+        self.rules = rules
+        self.counts: Dict[str, int] = {name: 0 for name in rules}
+        self.graph: Dict[str, Set[str]] = {name: set() for name in rules}
+        self.rulename = ""
+
+    def count(self) -> None:
+        for name, rule in self.rules.items():
+            self.rulename = name
+            self.visit(rule)
+
+    def visit_NameLeaf(self, node: NameLeaf) -> None:
+        if node.value in self.rules:
+            self.counts[node.value] += 1
+            self.graph[self.rulename].add(node.value)
+
+
+class AliasSubstituter(GrammarVisitor):
+    """Rebuild a rule's alternatives, replacing references to aliases."""
+
+    def __init__(self, aliases: Dict[str, NamedItem]):
+        self.aliases = aliases
+        self.changed = False
+
+    def substitute(self, node: NameLeaf) -> object:
+        alias = self.aliases.get(node.value)
+        if alias is None:
+            return node
+        self.changed = True
+        return alias.item
+
+    def visit_Rhs(self, node: Rhs) -> Rhs:
+        return Rhs([self.visit(alt) for alt in node.alts])
+
+    def visit_Alt(self, node: Alt) -> Alt:
+        return Alt([self.visit(item) for item in node.items], icut=node.icut, action=node.action)
+
+    def visit_NamedItem(self, node: NamedItem) -> NamedItem:
+        name = node.name
+        if isinstance(node.item, NameLeaf) and node.item.value in self.aliases and not name:
+            # Actions refer to the item by the name of the replaced rule.
+            name = node.item.value
+        return NamedItem(name, self.visit(node.item), node.type)
+
+    def visit_NameLeaf(self, node: NameLeaf) -> object:
+        return self.substitute(node)
+
+    def visit_StringLeaf(self, node: StringLeaf) -> StringLeaf:
+        return node
+
+    def visit_Cut(self, node: Cut) -> Cut:
+        return node
+
+    def visit_Group(self, node: Group) -> Group:
+        return Group(self.visit(node.rhs))
+
+    def visit_Opt(self, node: Opt) -> Opt:
+        return Opt(self.visit(node.node))
+
+    def visit_Repeat0(self, node: Repeat0) -> Repeat0:
+        return Repeat0(self.visit(node.node))
+
+    def visit_Repeat1(self, node: Repeat1) -> Repeat1:
+        return Repeat1(self.visit(node.node))
+
+    def visit_Gather(self, node: Gather) -> Gather:
+        return Gather(self.visit(node.separator), self.visit(node.node))
+
+    def visit_PositiveLookahead(self, node: PositiveLookahead) -> PositiveLookahead:
+        return PositiveLookahead(self.visit(node.node))
+
+    def visit_NegativeLookahead(self, node: NegativeLookahead) -> NegativeLookahead:
+        return NegativeLookahead(self.visit(node.node))
+
+    def visit_Forced(self, node: Forced) -> Forced:
+        return Forced(self.visit(node.node))
+
+
+def _passed_through(alt: Alt) -> Optional[NamedItem]:
+    """Return the only item of alt if its action just returns it."""
+    if len(alt.items) != 1 or not alt.action:
+        return None
+    item = alt.items[0]
+    name = item.name
+    if name is None and isinstance(item.item, NameLeaf):
+        name = item.item.value
+    if alt.action.strip() != name:
+        return None
+    return item
+
+
+def _has_cut(rhs: Rhs) -> bool:
+    return any(isinstance(item.item, Cut) for alt in rhs.alts for item in alt.items)
+
+
+def _item_name(item: NamedItem) -> Optional[str]:
+    if item.name is None and isinstance(item.item, NameLeaf):
+        return item.item.value
+    return item.name
+
+
+def _true_when_matched(item: NamedItem) -> bool:
+    """Return whether the value of item is true whenever it matches."""
+    node = item.item
+    while isinstance(node, Group) and len(node.rhs.alts) == 1:
+        if len(node.rhs.alts[0].items) != 1:
+            return True
+        node = node.rhs.alts[0].items[0].item
+    # Optional items match with None or an empty list.
+    return not isinstance(node, (Opt, Repeat0))
+
+
+def _returns_true(alt: Alt, default_result: str) -> bool:
+    """Return whether alt's result is true whenever it matches.
+
+    The default result (see PythonParserGenerator.default_action()) is
+    made of the values of the items other than lookaheads and cuts.
+    """
+    if alt.action:
+        action = alt.action.strip()
+        return any(_item_name(item) == action and _true_when_matched(item) for item in alt.items)
+    values = [
+        item
+        for item in alt.items
+        if not isinstance(item.item, (Cut, PositiveLookahead, NegativeLookahead))
+    ]
+    if default_result == "single" and len(values) == 1:
+        return _true_when_matched(values[0])
+    return bool(values)
+
+
+class GrammarOptimizer:
+    def __init__(self, grammar: Grammar, keep: AbstractSet[str] = frozenset()):
+        self.grammar = grammar
+        # Fresh rules, so that the analyses below do not mark the rules
+        # of the original grammar as visited.
+        self.rules = {
+            name: Rule(name, rule.type, rule.flatten(), rule.memo)
+            for name, rule in grammar.rules.items()
+        }
+        self.roots = {"start"} if "start" in self.rules else set(self.rules)
+        self.keep = {name for name, rule in self.rules.items() if rule.memo} | set(keep)
+        self.default_result = grammar.metas.get("default_result") or "list"
+
+    def optimize(self) -> Grammar:
+        while self.inline():
+            self.eliminate_dead_rules()
+        self.eliminate_dead_rules()
+        return Grammar(self.rules.values(), self.grammar.metas.items())
+
+    def analyze(self) -> Set[str]:
+        """Return the names of the left-recursive rules."""
+        rules = {name: Rule(name, rule.type, rule.rhs) for name, rule in self.rules.items()}
+        compute_nullables(rules)
+        compute_left_recursives(rules)
+        return {name for name, rule in rules.items() if rule.left_recursive}
+
+    def inline(self) -> bool:
+        """Inline aliases and splice rules once; return whether anything changed."""
+        counter = RuleReferenceCounter(self.rules)
+        counter.count()
+        left_recursive = self.analyze()
+        inlinable = set(self.rules) - left_recursive - self.keep - self.roots
+
+        aliases: Dict[str, NamedItem] = {}
+        for name in inlinable:
+            alts = self.rules[name].rhs.alts
+            item = _passed_through(alts[0]) if len(alts) == 1 else None
+            if item is None:
+                continue
+            # (A group would have been flattened into the rule.)
+            if isinstance(item.item, (NameLeaf, StringLeaf)):
+                aliases[name] = item
+
+        spliced: Set[str] = set()
+        changed = False
+        for name, rule in list(self.rules.items()):
+            substituter = AliasSubstituter(aliases)
+            rhs = substituter.visit(rule.rhs)
+            if not substituter.changed:
+                rhs = rule.rhs
+            if name not in left_recursive:
+                rhs = self.splice(rhs, inlinable - set(aliases) - spliced, counter.counts, spliced)
+            if rhs is not rule.rhs:
+                self.rules[name] = Rule(name, rule.type, rhs, rule.memo)
+                changed = True
+        return changed
+
+    def splice(
+        self, rhs: Rhs, candidates: Set[str], counts: Dict[str, int], spliced: Set[str]
+    ) -> Rhs:
+        alts: List[Alt] = []
+        changed = False
+        for alt in rhs.alts:
+            item = _passed_through(alt)
+            if item is not None:
+                node = item.item
+                if isinstance(node, Group) and self.spliceable(node.rhs):
+                    alts.extend(node.rhs.alts)
+                    changed = True
+                    continue
+                if (
+                    isinstance(node, NameLeaf)
+                    and node.value in candidates
+                    and counts[node.value] == 1
+                    and self.spliceable(self.rules[node.value].rhs)
+                ):
+                    alts.extend(self.rules[node.value].rhs.alts)
+                    spliced.add(node.value)
+                    changed = True
+                    continue
+            alts.append(alt)
+        if not changed:
+            return rhs
+        return Rhs(alts)
+
+    def spliceable(self, rhs: Rhs) -> bool:
+        return not _has_cut(rhs) and all(
+            _returns_true(alt, self.default_result) for alt in rhs.alts
+        )
+
+    def eliminate_dead_rules(self) -> None:
+        counter = RuleReferenceCounter(self.rules)
+        counter.count()
+        reachable: Set[str] = set()
+        todo = list(self.roots)
+        while todo:
+            name = todo.pop()
+            if name not in reachable:
+                reachable.add(name)
+                todo.extend(counter.graph[name])
+        self.rules = {name: rule for name, rule in self.rules.items() if name in reachable}
+
+
+def optimize_grammar(grammar: Grammar, keep: AbstractSet[str] = frozenset()) -> Grammar:
+    """Return an optimized copy of grammar (see the module docstring).
+
+    The rules named in keep (e.g. those of a memo plan) are not inlined.
+    """
+    return GrammarOptimizer(grammar, keep).optimize()
@@ -1,13 +1,42 @@
 import argparse
+import ast
+import copy
+import itertools
+import os
 import sys
 import time
 import token
 import tokenize
 import traceback
 from abc import abstractmethod
-from typing import Any, Callable, Dict, Optional, Tuple, Type, TypeVar, cast
-
-from pegen.tokenizer import Mark, Tokenizer, exact_token_types
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    overload,
+)
+
+from pegen.token_cache import TokenCache
+from pegen.tokenizer import (
+    IncrementalTokenizer,
+    Mark,
+    Tokenizer,
+    exact_token_types,
+    generate_source_tokens,
+    read_source,
+    shift_token,
+)
 
 T = TypeVar("T")
 P = TypeVar("P", bound="Parser")
@@ -17,11 +46,13 @@ F = TypeVar("F", bound=Callable[..., Any])
 def logger(method: F) -> F:
     """For non-memoized functions that we want to be logged.
 
-    (In practice this is only non-leader left-recursive functions.)
+    (In practice this is only non-leader left-recursive functions, and
+    rules that are not memoized.)  The method itself is returned, so it
+    costs nothing unless the parser is verbose.
     """
     method_name = method.__name__
 
-    def logger_wrapper(self: P, *args: object) -> T:
+    def logger_wrapper(self: P, *args: object) -> Any:
         if not self._verbose:
             return method(self, *args)
         argsr = ",".join(repr(arg) for arg in args)
@@ -34,26 +65,79 @@ def logger(method: F) -> F:
         return tree
 
     logger_wrapper.__wrapped__ = method  # type: ignore
-    return cast(F, logger_wrapper)
+    method.traced = logger_wrapper  # type: ignore
+    return method
+
+
+# A rule is worth memoizing if at least this fraction of its calls hit the cache.
+DEFAULT_MIN_HIT_RATE = 0.1
 
+# Rule ids below this value are reserved for the terminal methods of Parser
+# (only expect() still uses one).
+# Generated rules are numbered starting here (see ParserGenerator.rule_id()).
+FIRST_RULE_ID = 1000
 
+# Rules memoized without an explicit id (e.g. parsers generated by older
+# versions of pegen) are numbered downwards from -1 when they are decorated.
+_anonymous_rule_ids = itertools.count(-1, -1)
+
+
+@overload
 def memoize(method: F) -> F:
-    """Memoize a symbol method."""
+    ...
+
+
+@overload
+def memoize(method: int) -> Callable[[F], F]:
+    ...
+
+
+def memoize(method: Union[F, int]) -> Union[F, Callable[[F], F]]:
+    """Memoize a symbol method.
+
+    Can be used either as a plain decorator or as a decorator factory
+    taking the rule id assigned by the generator, e.g. @memoize(1000).
+    """
+    if isinstance(method, int):
+        rule_id = method
+        return lambda method: _memoize(method, rule_id)
+    return _memoize(method, next(_anonymous_rule_ids))
+
+
+def _memoize(method: F, rule_id: int) -> F:
     method_name = method.__name__
 
-    def memoize_wrapper(self: P, *args: object) -> T:
+    def memoize_wrapper(self: P, *args: object) -> Any:
         mark = self.mark()
-        key = mark, method_name, args
-        # Fast path: cache hit, and not verbose.
-        if key in self._cache and not self._verbose:
-            tree, endmark = self._cache[key]
+        memo = self._memo
+        if mark < len(memo):
+            slot = memo[mark]
+        else:
+            slot = self._memo_slot(mark)
+        key = (rule_id, args) if args else rule_id
+        entry = slot.get(key)
+        if entry is not None:
+            tree, endmark = entry
             self.reset(endmark)
             return tree
-        # Slow path: no cache hit, or verbose.
+        tree = method(self, *args)
+        slot[key] = tree, self.mark()
+        return tree
+
+    def memoize_traced_wrapper(self: P, *args: object) -> Any:
+        mark = self.mark()
+        memo = self._memo
+        if mark < len(memo):
+            slot = memo[mark]
+        else:
+            slot = self._memo_slot(mark)
+        key = (rule_id, args) if args else rule_id
+        entry = slot.get(key)
         verbose = self._verbose
+        stats = self._memo_stats
         argsr = ",".join(repr(arg) for arg in args)
         fill = "  " * self._level
-        if key not in self._cache:
+        if entry is None:
             if verbose:
                 print(f"{fill}{method_name}({argsr}) ... (looking at {self.showpeek()})")
             self._level += 1
@@ -62,34 +146,106 @@ def memoize(method: F) -> F:
             if verbose:
                 print(f"{fill}... {method_name}({argsr}) -> {tree!s:.200}")
             endmark = self.mark()
-            self._cache[key] = tree, endmark
+            slot[key] = tree, endmark
+            if stats is not None:
+                stats.miss(method_name)
         else:
-            tree, endmark = self._cache[key]
+            tree, endmark = entry
             if verbose:
                 print(f"{fill}{method_name}({argsr}) -> {tree!s:.200}")
+            if stats is not None:
+                stats.hit(method_name)
             self.reset(endmark)
         return tree
 
     memoize_wrapper.__wrapped__ = method  # type: ignore
+    memoize_wrapper.rule_id = rule_id  # type: ignore
+    memoize_wrapper.traced = memoize_traced_wrapper  # type: ignore
     return cast(F, memoize_wrapper)
 
 
+def memoize_inline(rule_id: int) -> Callable[[F], F]:
+    """Mark a method whose memoization was inlined by the generator.
+
+    The method itself is returned; only its traced version, used by
+    verbose and profiled parsers, goes through a memoize() wrapper.
+    """
+
+    def decorator(method: F) -> F:
+        wrapper = _memoize(method, rule_id)
+        method.rule_id = rule_id  # type: ignore
+        method.traced = wrapper.traced  # type: ignore
+        return method
+
+    return decorator
+
+
+@overload
 def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Optional[T]]:
-    """Memoize a left-recursive symbol method."""
+    ...
+
+
+@overload
+def memoize_left_rec(
+    method: int,
+) -> Callable[[Callable[[P], Optional[T]]], Callable[[P], Optional[T]]]:
+    ...
+
+
+def memoize_left_rec(method: Union[Callable[[P], Optional[T]], int]) -> Any:
+    """Memoize a left-recursive symbol method.
+
+    Like memoize(), this also accepts the rule id assigned by the generator.
+    """
+    if isinstance(method, int):
+        rule_id = method
+        return lambda method: _memoize_left_rec(method, rule_id)
+    return _memoize_left_rec(method, next(_anonymous_rule_ids))
+
+
+def _memoize_left_rec(
+    method: Callable[[P], Optional[T]], rule_id: int
+) -> Callable[[P], Optional[T]]:
     method_name = method.__name__
 
     def memoize_left_rec_wrapper(self: P) -> Optional[T]:
         mark = self.mark()
-        key = mark, method_name, ()
-        # Fast path: cache hit, and not verbose.
-        if key in self._cache and not self._verbose:
-            tree, endmark = self._cache[key]
+        memo = self._memo
+        if mark < len(memo):
+            slot = memo[mark]
+        else:
+            slot = self._memo_slot(mark)
+        entry = slot.get(rule_id)
+        if entry is not None:
+            tree, endmark = entry
             self.reset(endmark)
             return tree
-        # Slow path: no cache hit, or verbose.
+        # See memoize_left_rec_traced_wrapper() for how this works.
+        slot[rule_id] = lastresult, lastmark = None, mark
+        while True:
+            self.reset(mark)
+            result = method(self)
+            endmark = self.mark()
+            if not result or endmark <= lastmark:
+                break
+            slot[rule_id] = lastresult, lastmark = result, endmark
+        # On failure lastmark is still mark.
+        self.reset(lastmark)
+        slot[rule_id] = lastresult, lastmark
+        return lastresult
+
+    def memoize_left_rec_traced_wrapper(self: P) -> Optional[T]:
+        mark = self.mark()
+        memo = self._memo
+        if mark < len(memo):
+            slot = memo[mark]
+        else:
+            slot = self._memo_slot(mark)
+        entry = slot.get(rule_id)
         verbose = self._verbose
+        stats = self._memo_stats
         fill = "  " * self._level
-        if key not in self._cache:
+        if entry is None:
             if verbose:
                 print(f"{fill}{method_name} ... (looking at {self.showpeek()})")
             self._level += 1
@@ -103,7 +259,7 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
             # (http://web.cs.ucla.edu/~todd/research/pub.php?id=pepm08).
 
             # Prime the cache with a failure.
-            self._cache[key] = None, mark
+            slot[rule_id] = None, mark
             lastresult, lastmark = None, mark
             depth = 0
             if verbose:
@@ -126,7 +282,9 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
                     if verbose:
                         print(f"{fill}Bailing with {lastresult!s:.200} to {lastmark}")
                     break
-                self._cache[key] = lastresult, lastmark = result, endmark
+                slot[rule_id] = lastresult, lastmark = result, endmark
+                if stats is not None:
+                    stats.store(method_name)
 
             self.reset(lastmark)
             tree = lastresult
@@ -139,69 +297,405 @@ def memoize_left_rec(method: Callable[[P], Optional[T]]) -> Callable[[P], Option
             else:
                 endmark = mark
                 self.reset(endmark)
-            self._cache[key] = tree, endmark
+            slot[rule_id] = tree, endmark
+            if stats is not None:
+                stats.miss(method_name, stores=2)  # The priming and the final result.
         else:
-            tree, endmark = self._cache[key]
+            tree, endmark = entry
             if verbose:
                 print(f"{fill}{method_name}() -> {tree!s:.200} [fresh]")
+            if stats is not None:
+                stats.hit(method_name)
             if tree:
                 self.reset(endmark)
         return tree
 
     memoize_left_rec_wrapper.__wrapped__ = method  # type: ignore
+    memoize_left_rec_wrapper.rule_id = rule_id  # type: ignore
+    memoize_left_rec_wrapper.traced = memoize_left_rec_traced_wrapper  # type: ignore
     return memoize_left_rec_wrapper
 
 
+class MemoStats:
+    """Per-rule memoization statistics collected over one or more parses.
+
+    Pass an instance to the Parser constructor to profile it.  Only rules
+    that are memoized are counted, so profile a parser generated with all
+    rules memoized (the default) to obtain a useful memo plan.
+    """
+
+    def __init__(self) -> None:
+        # Rule name -> [hits, misses, stores]
+        self.counts: Dict[str, List[int]] = {}
+
+    def _counts(self, name: str) -> List[int]:
+        counts = self.counts.get(name)
+        if counts is None:
+            counts = self.counts[name] = [0, 0, 0]
+        return counts
+
+    def hit(self, name: str) -> None:
+        self._counts(name)[0] += 1
+
+    def miss(self, name: str, stores: int = 1) -> None:
+        counts = self._counts(name)
+        counts[1] += 1
+        counts[2] += stores
+
+    def store(self, name: str) -> None:
+        self._counts(name)[2] += 1
+
+    def worth_memoizing(self, name: str, min_hit_rate: float = DEFAULT_MIN_HIT_RATE) -> bool:
+        """Whether enough calls to the rule were cache hits."""
+        hits, misses, stores = self._counts(name)
+        return hits > 0 and hits >= min_hit_rate * (hits + misses)
+
+    def write_plan(self, file: IO[str], min_hit_rate: float = DEFAULT_MIN_HIT_RATE) -> None:
+        """Write a memo plan, listing the rules worth memoizing.
+
+        Each line holds a rule name followed by its hits, misses and
+        stores.  Rules not worth memoizing are listed as comments.
+        """
+        print(f"# pegen memo plan (min hit rate {min_hit_rate})", file=file)
+        print("# rule hits misses stores", file=file)
+        for name, (hits, misses, stores) in sorted(
+            self.counts.items(), key=lambda item: (-item[1][0], item[0])
+        ):
+            prefix = "" if self.worth_memoizing(name, min_hit_rate) else "# "
+            print(f"{prefix}{name} {hits} {misses} {stores}", file=file)
+
+
+def read_memo_plan(file: IO[str]) -> Set[str]:
+    """Read a memo plan written by MemoStats.write_plan().
+
+    Return the names of the rules to memoize.
+    """
+    names = set()
+    for line in file:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # Extra fields ignored
+        names.add(line.split()[0])
+    return names
+
+
+def _shift_rows(tree: Any, rows: int) -> Any:
+    """Return tree with its tokens and AST nodes moved down by rows rows.
+
+    The parts of tree holding no positions are shared with the result.
+    Raise TypeError for objects that may hold positions in unknown ways.
+    """
+    if isinstance(tree, ast.AST):
+        node = tree
+        for name in tree._fields:
+            value = getattr(tree, name, None)
+            new_value = _shift_rows(value, rows)
+            if new_value is not value:
+                if node is tree:
+                    node = copy.copy(tree)
+                setattr(node, name, new_value)
+        for name in ("lineno", "end_lineno"):
+            value = getattr(tree, name, None)
+            if value is not None:
+                if node is tree:
+                    node = copy.copy(tree)
+                setattr(node, name, value + rows)
+        return node
+    if type(tree) is list or type(tree) is tuple:
+        items = [_shift_rows(item, rows) for item in tree]
+        if all(new is old for new, old in zip(items, tree)):
+            return tree
+        return items if type(tree) is list else tuple(items)
+    if isinstance(tree, tokenize.TokenInfo):
+        return shift_token(tree, rows)
+    if tree is None or isinstance(tree, (bool, int, float, complex, str, bytes)):
+        return tree
+    raise TypeError(f"Cannot move a {type(tree).__name__} to other rows")
+
+
+class _TrackedSlot(Dict[Any, Tuple[Any, Mark]]):
+    """A memo slot of a parser using an IncrementalTokenizer.
+
+    It records how many tokens from its position its entries may depend
+    on: whatever the tokenizer had examined when they were stored.  Hits
+    count as examining the tokens their entries depend on.
+
+    Edits before the slot move its entries by some tokens and rows; these
+    shifts are applied on the next lookup, to the trees only as they are
+    looked up.
+    """
+
+    __slots__ = ("tokenizer", "start", "span", "marks", "rows", "moved")
+
+    def __init__(self, tokenizer: IncrementalTokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+        # Lookups only happen at the slot's position, and stores follow
+        # them, so the span can be relative: edits move slots around.
+        self.start = 0
+        self.span = 0
+        # Pending shifts of the end marks and of the trees' rows, and the
+        # keys whose trees are still to move by some rows.
+        self.marks = 0
+        self.rows = 0
+        self.moved: Dict[Any, int] = {}
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        tokenizer = self.tokenizer
+        self.start = tokenizer._index
+        if self.marks or self.rows:
+            self._catch_up()
+        entry = dict.get(self, key, default)
+        if self.moved and key in self.moved:
+            entry = self._move(key, default)
+        if entry is not None and self.start + self.span > tokenizer._examined:
+            tokenizer._examined = self.start + self.span
+        return entry
+
+    def __setitem__(self, key: Any, entry: Tuple[Any, Mark]) -> None:
+        dict.__setitem__(self, key, entry)
+        if self.moved:
+            self.moved.pop(key, None)
+        span = self.tokenizer._examined - self.start
+        if span > self.span:
+            self.span = span
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self.moved.clear()
+
+    def _catch_up(self) -> None:
+        """Apply the pending shift of the end marks, and record that of the rows."""
+        marks, rows = self.marks, self.rows
+        self.marks = self.rows = 0
+        moved = self.moved
+        for key, (tree, endmark) in self.items():
+            if marks:
+                dict.__setitem__(self, key, (tree, endmark + marks))
+            if rows:
+                moved[key] = moved.get(key, 0) + rows
+
+    def _move(self, key: Any, default: Any) -> Any:
+        """Move the tree of the entry for key to its rows, and return the entry."""
+        tree, endmark = dict.__getitem__(self, key)
+        try:
+            entry = _shift_rows(tree, self.moved.pop(key)), endmark
+        except TypeError:
+            del self[key]
+            return default
+        dict.__setitem__(self, key, entry)
+        return entry
+
+
 class Parser:
     """Parsing base class."""
 
-    def __init__(self, tokenizer: Tokenizer, *, verbose: bool = False):
+    # Method name -> instrumented version of the method (see memoize()),
+    # installed on instances that are verbose or collect memo statistics.
+    _traced_methods: Dict[str, Callable[..., Any]] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        traced: Dict[str, Callable[..., Any]] = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if hasattr(value, "traced"):
+                    traced[name] = value.traced
+                else:
+                    traced.pop(name, None)
+        cls._traced_methods = traced
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        *,
+        verbose: bool = False,
+        memo_stats: Optional[MemoStats] = None,
+    ):
         self._tokenizer = tokenizer
         self._verbose = verbose
+        self._memo_stats = memo_stats
         self._level = 0
-        self._cache: Dict[Tuple[Mark, str, Tuple[Any, ...]], Tuple[Any, Mark]] = {}
+        # Packrat memo table: one slot per token position, mapping a rule id
+        # (or a (rule id, args) tuple for rules taking arguments) to the
+        # rule's result and end mark.
+        self._memo: List[Dict[Any, Tuple[Any, Mark]]] = []
+        # Memo slots before this position have been cleared (see prune()).
+        self._pruned = 0
         # Pass through common tokenizer methods.
         # TODO: Rename to _mark and _reset.
         self.mark = self._tokenizer.mark
         self.reset = self._tokenizer.reset
+        if verbose or memo_stats is not None:
+            for name, method in self._traced_methods.items():
+                setattr(self, name, method.__get__(self))
+        if isinstance(tokenizer, IncrementalTokenizer):
+            self._memo_slot = self._tracked_memo_slot  # type: ignore
 
     @abstractmethod
     def start(self) -> Any:
         pass
 
+    def _memo_slot(self, mark: Mark) -> Dict[Any, Tuple[Any, Mark]]:
+        """Return the memo slot for mark, growing the memo table as needed."""
+        memo = self._memo
+        memo.extend({} for _ in range(mark + 1 - len(memo)))
+        return memo[mark]
+
+    def _tracked_memo_slot(self, mark: Mark) -> Dict[Any, Tuple[Any, Mark]]:
+        memo = self._memo
+        tokenizer = self._tokenizer
+        memo.extend(_TrackedSlot(tokenizer) for _ in range(mark + 1 - len(memo)))  # type: ignore
+        return memo[mark]
+
+    def edit(self, offset: int, removed: int, inserted: str) -> None:
+        """Replace removed characters at offset in the source by inserted.
+
+        The parser must use an IncrementalTokenizer.  Only the memo entries
+        that depend on the tokens the edit replaced are discarded; the
+        others move along with their tokens, so calling the start rule
+        again reparses little more than the edited statements.  When the
+        edit adds or removes lines, the tokens and AST nodes in the trees
+        after it are moved too, when they are next looked up; entries
+        holding other objects are discarded then.
+        """
+        tokenizer = self._tokenizer
+        if not isinstance(tokenizer, IncrementalTokenizer):
+            raise TypeError("edit() requires an IncrementalTokenizer")
+        change = tokenizer.edit(offset, removed, inserted)
+        start = change.start
+        memo = cast(List[_TrackedSlot], self._memo)
+        for pos in range(min(start, len(memo))):
+            slot = memo[pos]
+            if pos + slot.span > start:
+                slot.clear()
+                slot.span = 0
+        if change.resynced and len(memo) > change.old_end:
+            shift = change.new_end - change.old_end
+            rows = change.row_delta
+            if shift or rows:
+                # End marks are absolute, unlike spans.
+                for slot in memo[change.old_end :]:
+                    slot.marks += shift
+                    slot.rows += rows
+            memo[start : change.old_end] = [
+                _TrackedSlot(tokenizer) for _ in range(change.new_end - start)
+            ]
+        else:
+            del memo[start:]
+        self._pruned = min(self._pruned, start)
+
+    def memo_size(self) -> int:
+        """Return the total number of memoized results."""
+        return sum(len(slot) for slot in self._memo)
+
+    def prune(self, mark: Mark) -> None:
+        """Discard the memo entries for positions before mark."""
+        memo = self._memo
+        end = min(mark, len(memo))
+        for pos in range(self._pruned, end):
+            memo[pos].clear()
+        self._pruned = max(self._pruned, end)
+
+    def cut(self, mark: Mark) -> bool:
+        """Commit to the alternative starting at mark; always true.
+
+        Parsers generated with prune=True call this for each cut (~), so
+        the memo entries before the alternative are discarded.
+        """
+        self.prune(mark)
+        return True
+
+    def commit(self, mark: Mark) -> None:
+        """Promise never to backtrack before mark, the current position.
+
+        Discards both the memo entries and the tokens before mark, and
+        renumbers the remaining tokens like stream() does, so marks taken
+        before must not be used again.  Parsers generated with prune=True
+        call this between top-level statements.
+        """
+        self._tokenizer.rebase(mark)
+        if self.mark() == mark:  # The tokenizer keeps its numbering.
+            self.prune(mark)
+        else:
+            self._memo.clear()
+            self._pruned = 0
+
+    def stream(self, rule: str, filename: str = "<unknown>") -> Iterator[Any]:
+        """Parse the input as a sequence of rule, yielding each result.
+
+        This stops at the ENDMARKER token, and raises a SyntaxError if the
+        rule fails before, or matches without consuming any token (it would
+        match there forever).  After each result, the tokens and the memo
+        entries behind it are discarded, so memory use does not grow with
+        the input.
+        """
+        method = getattr(self, rule)
+        tokenizer = self._tokenizer
+        while tokenizer.peek().type != token.ENDMARKER:
+            mark = self.mark()
+            tree = method()
+            if not tree or self.mark() == mark:
+                raise self.make_syntax_error(filename)
+            yield tree
+            # The entries after the mark hold absolute end marks; it is
+            # simpler to drop them as well.
+            self._memo.clear()
+            self._pruned = 0
+            tokenizer.rebase(self.mark())
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        """Start over on the tokens of another input.
+
+        The tokenizer, the memo table and the methods bound by __init__()
+        are kept, as are the verbosity and the memo statistics, which keep
+        counting over all the inputs.
+        """
+        self._tokenizer.restart(tokengen)
+        self._memo.clear()
+        self._pruned = 0
+        self._level = 0
+
+    def parse_many(self, sources: Iterable[str], rule: str = "start") -> Iterator[Any]:
+        """Parse each source string with rule, yielding the results.
+
+        The parser restarts on each source (see restart()), which is not
+        faster than making a parser for each source, but keeps a single
+        set of memo statistics for the batch.  Like the rule itself, this
+        yields None for a source that does not parse; make_syntax_error()
+        describes the failure until the next source is parsed.
+        """
+        method = getattr(self, rule)
+        for source in sources:
+            self.restart(generate_source_tokens(source))
+            yield method()
+
     def showpeek(self) -> str:
         tok = self._tokenizer.peek()
         return f"{tok.start[0]}.{tok.start[1]}: {token.tok_name[tok.type]}:{tok.string!r}"
 
-    @memoize
+    # Matching a single token costs less than a memo lookup, so the
+    # terminal methods are not memoized (except expect(), whose
+    # matching is more involved).
+
+    @logger
     def name(self) -> Optional[tokenize.TokenInfo]:
-        tok = self._tokenizer.peek()
-        if tok.type == token.NAME:
-            return self._tokenizer.getnext()
-        return None
+        return self._tokenizer.match_type(token.NAME)
 
-    @memoize
+    @logger
     def number(self) -> Optional[tokenize.TokenInfo]:
-        tok = self._tokenizer.peek()
-        if tok.type == token.NUMBER:
-            return self._tokenizer.getnext()
-        return None
+        return self._tokenizer.match_type(token.NUMBER)
 
-    @memoize
+    @logger
     def string(self) -> Optional[tokenize.TokenInfo]:
-        tok = self._tokenizer.peek()
-        if tok.type == token.STRING:
-            return self._tokenizer.getnext()
-        return None
+        return self._tokenizer.match_type(token.STRING)
 
-    @memoize
+    @logger
     def op(self) -> Optional[tokenize.TokenInfo]:
-        tok = self._tokenizer.peek()
-        if tok.type == token.OP:
-            return self._tokenizer.getnext()
-        return None
+        return self._tokenizer.match_type(token.OP)
 
-    @memoize
+    @memoize(5)
     def expect(self, type: str) -> Optional[tokenize.TokenInfo]:
         tok = self._tokenizer.peek()
         if tok.string == type:
@@ -216,6 +710,15 @@ class Parser:
             return self._tokenizer.getnext()
         return None
 
+    @logger
+    def expect_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        """Match the next token if its string is string, without memoizing.
+
+        Generated parsers call this for literals that are not token names;
+        for those, expect() accepts exactly the tokens spelled as the literal.
+        """
+        return self._tokenizer.match_string(string)
+
     def positive_lookahead(self, func: Callable[..., T], *args: object) -> T:
         mark = self.mark()
         ok = func(*args)
@@ -247,6 +750,9 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
     argparser.add_argument(
         "-q", "--quiet", action="store_true", help="Don't print the parsed program"
     )
+    argparser.add_argument(
+        "--token-cache", metavar="DIR", help="Cache token streams in this directory"
+    )
     argparser.add_argument("filename", help="Input file ('-' to use stdin)")
 
     args = argparser.parse_args()
@@ -259,11 +765,17 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
     filename = args.filename
     if filename == "" or filename == "-":
         filename = "<stdin>"
-        file = sys.stdin
+        file = sys.stdin.buffer
     else:
-        file = open(args.filename)
+        file = open(args.filename, "rb")
+    token_cache = None
     try:
-        tokengen = tokenize.generate_tokens(file.readline)
+        source = read_source(file)
+        if args.token_cache:
+            token_cache = TokenCache(args.token_cache)
+            tokengen = token_cache.generate_tokens(source)
+        else:
+            tokengen = generate_source_tokens(source)
         tokenizer = Tokenizer(tokengen, verbose=verbose_tokenizer)
         parser = parser_class(tokenizer, verbose=verbose_parser)
         tree = parser.start()
@@ -271,11 +783,12 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
             if file.isatty():
                 endpos = 0
             else:
-                endpos = file.tell()
-        except IOError:
+                # read_source() may map the file without reading it.
+                endpos = os.fstat(file.fileno()).st_size
+        except (OSError, ValueError):
             endpos = 0
     finally:
-        if file is not sys.stdin:
+        if file is not sys.stdin.buffer:
             file.close()
 
     t1 = time.time()
@@ -303,5 +816,7 @@ def simple_parser_main(parser_class: Type[Parser]) -> None:
             print()
         print("Caches sizes:")
         print(f"  token array : {len(tokenizer._tokens):10}")
-        print(f"        cache : {len(parser._cache):10}")
+        print(f"        cache : {parser.memo_size():10}")
+        if token_cache is not None:
+            print(f"Token cache: {token_cache.report()}")
         ## print_memstats()
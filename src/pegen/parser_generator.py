@@ -1,8 +1,9 @@
 import contextlib
 from abc import abstractmethod
-from typing import IO, AbstractSet, Dict, Iterator, List, Optional, Set, Text, Tuple
+from typing import IO, AbstractSet, Dict, Iterable, Iterator, List, Optional, Set, Text, Tuple
 
 from pegen import sccutils
+from pegen.parser import FIRST_RULE_ID
 from pegen.grammar import (
     Alt,
     Gather,
@@ -33,6 +34,18 @@ class RuleCheckingVisitor(GrammarVisitor):
         self.visit(node.item)
 
 
+class RuleReferenceVisitor(GrammarVisitor):
+    """Collect the names of the rules referenced from a grammar node."""
+
+    def __init__(self, rules: Dict[str, Rule]):
+        self.rules = rules
+        self.names: Set[str] = set()
+
+    def visit_NameLeaf(self, node: NameLeaf) -> None:
+        if node.value in self.rules:
+            self.names.add(node.value)
+
+
 class ParserGenerator:
 
     callmakervisitor: GrammarVisitor
@@ -54,6 +67,7 @@ class ParserGenerator:
         self.todo = self.rules.copy()  # Rules to generate
         self.counter = 0  # For name_rule()/name_loop()
         self.keyword_counter = 499  # For keyword_type()
+        self.rule_counter = FIRST_RULE_ID - 1  # For rule_id()
         self.all_rules: Dict[str, Rule] = {}  # Rules + temporal rules
         self._local_variable_stack: List[List[str]] = []
 
@@ -63,8 +77,8 @@ class ParserGenerator:
                 raise GrammarError(f"Rule names cannot start with underscore: '{rule}'")
 
     @contextlib.contextmanager
-    def local_variable_context(self) -> Iterator[None]:
-        self._local_variable_stack.append([])
+    def local_variable_context(self, names: Iterable[str] = ()) -> Iterator[None]:
+        self._local_variable_stack.append(list(names))
         yield
         self._local_variable_stack.pop()
 
@@ -111,6 +125,17 @@ class ParserGenerator:
         self.keyword_counter += 1
         return self.keyword_counter
 
+    def referenced_rules(self) -> Set[str]:
+        """Return the names of the rules referenced by some rule."""
+        visitor = RuleReferenceVisitor(self.rules)
+        for rule in self.rules.values():
+            visitor.visit(rule)
+        return visitor.names
+
+    def rule_id(self) -> int:
+        self.rule_counter += 1
+        return self.rule_counter
+
     def name_node(self, rhs: Rhs) -> str:
         self.counter += 1
         name = f"_tmp_{self.counter}"  # TODO: Pick a nicer name.
@@ -130,25 +155,8 @@ class ParserGenerator:
     def name_gather(self, node: Gather) -> str:
         self.counter += 1
         name = f"_gather_{self.counter}"
-        self.counter += 1
-        extra_function_name = f"_loop0_{self.counter}"
-        extra_function_alt = Alt(
-            [NamedItem(None, node.separator), NamedItem("elem", node.node)],
-            action="elem",
-        )
-        self.todo[extra_function_name] = Rule(
-            extra_function_name,
-            None,
-            Rhs([extra_function_alt]),
-        )
-        alt = Alt(
-            [NamedItem("elem", node.node), NamedItem("seq", NameLeaf(extra_function_name))],
-        )
-        self.todo[name] = Rule(
-            name,
-            None,
-            Rhs([alt]),
-        )
+        # The generator builds the list of elements itself.
+        self.todo[name] = Rule(name, None, Rhs([Alt([NamedItem(None, node)])]))
         return name
 
     def dedupe(self, name: str) -> str:
@@ -1,11 +1,15 @@
+import ast
+import re
 import token
-from typing import IO, Any, Dict, Optional, Text, Tuple
+from typing import IO, AbstractSet, Any, Dict, Iterable, List, Optional, Set, Text, Tuple
 
 from pegen import grammar
+from pegen.first_sets import GuardSetCalculator
 from pegen.grammar import (
     Alt,
     Cut,
     Gather,
+    GrammarError,
     GrammarVisitor,
     Group,
     Lookahead,
@@ -20,6 +24,7 @@ from pegen.grammar import (
     Rule,
     StringLeaf,
 )
+from pegen.optimizer import optimize_grammar
 from pegen.parser_generator import ParserGenerator
 
 MODULE_PREFIX = """\
@@ -32,7 +37,7 @@ import tokenize
 
 from typing import Any, Optional
 
-from pegen.parser import memoize, memoize_left_rec, logger, Parser
+from pegen.parser import memoize, memoize_inline, memoize_left_rec, logger, Parser
 
 """
 MODULE_SUFFIX = """
@@ -42,23 +47,78 @@ if __name__ == '__main__':
     simple_parser_main(GeneratedParser)
 """
 
+# Token names matched by the Parser method of the same name, lowercased.
+TYPED_TOKENS = ("NAME", "NUMBER", "STRING", "OP")
+# Token names matched by Parser.expect(), which also accepts a token
+# whose string is the name itself.
+EXPECTED_TOKENS = ("NEWLINE", "DEDENT", "INDENT", "ENDMARKER", "ASYNC", "AWAIT", "TYPE_COMMENT")
+
+# Values of the default_result meta: how alternatives without an action
+# build their result from the values of their items (see default_action()).
+DEFAULT_RESULTS = ("list", "tuple", "single")
+
+# Calls to helper rules, and the value they return when failing.
+HELPER_CALL_RE = re.compile(r"self\.(_tmp|_loop0|_loop1|_gather)_\d+\(\)")
+HELPER_FAILURE = {"_tmp": "None", "_loop0": "[]", "_loop1": "[]", "_gather": "None"}
+
+
+def _has_cut(alt: Alt) -> bool:
+    return any(isinstance(item.item, Cut) for item in alt.items)
+
+
+def _common_prefix(alt: Alt, other: Alt, offset: int) -> int:
+    """Return how many items after offset alt and other have in common."""
+    length = 0
+    for item, other_item in zip(alt.items[offset:], other.items[offset:]):
+        if item.name != other_item.name or repr(item.item) != repr(other_item.item):
+            break
+        length += 1
+    return length
+
+
+def _unwrap(node: Any) -> Any:
+    """Return the item of a group (or rhs) made of a single item, or node itself."""
+    if isinstance(node, Group):
+        node = node.rhs
+    if isinstance(node, Rhs) and len(node.alts) == 1 and len(node.alts[0].items) == 1:
+        return _unwrap(node.alts[0].items[0].item)
+    return node
+
+
+def _value_unused(item: NamedItem, alt: Alt) -> bool:
+    """Return whether alt's action cannot refer to the value of item.
+
+    That is the case of an unnamed repeat (whose default name is that of
+    its helper rule), or of an unnamed optional one unless the action
+    mentions opt or a deduplicated variant of it, such as opt_1.
+    """
+    if item.name or not alt.action:
+        return False
+    if isinstance(item.item, Opt):
+        return re.search(r"\bopt\w*", alt.action) is None
+    return isinstance(item.item, (Repeat0, Repeat1, Gather))
+
 
 class PythonCallMakerVisitor(GrammarVisitor):
-    def __init__(self, parser_generator: ParserGenerator):
+    def __init__(self, parser_generator: "PythonParserGenerator"):
         self.gen = parser_generator
         self.cache: Dict[Any, Any] = {}
 
     def visit_NameLeaf(self, node: NameLeaf) -> Tuple[Optional[str], str]:
         name = node.value
-        if name in ("NAME", "NUMBER", "STRING", "OP"):
+        if name in TYPED_TOKENS:
             name = name.lower()
             return name, f"self.{name}()"
-        if name in ("NEWLINE", "DEDENT", "INDENT", "ENDMARKER", "ASYNC", "AWAIT"):
+        if name in EXPECTED_TOKENS:
             return name.lower(), f"self.expect({name!r})"
         return name, f"self.{name}()"
 
     def visit_StringLeaf(self, node: StringLeaf) -> Tuple[str, str]:
-        return "literal", f"self.expect({node.value})"
+        value = ast.literal_eval(node.value)
+        if isinstance(token.__dict__.get(value), int):
+            # Literals like 'NEWLINE' also match by token type.
+            return "literal", f"self.expect({node.value})"
+        return "literal", f"self.expect_string({value!r})"
 
     def visit_Rhs(self, node: Rhs) -> Tuple[Optional[str], str]:
         if node in self.cache:
@@ -76,20 +136,56 @@ class PythonCallMakerVisitor(GrammarVisitor):
             name = node.name
         return name, call
 
-    def lookahead_call_helper(self, node: Lookahead) -> Tuple[str, str]:
-        name, call = self.visit(node.node)
-        head, tail = call.split("(", 1)
-        assert tail[-1] == ")"
-        tail = tail[:-1]
-        return head, tail
+    def visit_unused(self, node: Any) -> Tuple[Optional[str], str]:
+        """Return the name and call of node, when its value is not used.
+
+        Repeats (including those of an optional item) then call helper
+        rules that only count the items they match.
+        """
+        if isinstance(node, Opt):
+            name, call = self.visit_unused(node.node)
+            return "opt", call if call.endswith(",") else f"{call},"
+        node = _unwrap(node)
+        if not isinstance(node, (Repeat0, Repeat1, Gather)):
+            return self.visit(node)
+        key = ("unused", node)
+        if key not in self.cache:
+            if isinstance(node, Gather):
+                name = self.gen.name_gather(node)
+            else:
+                name = self.gen.name_loop(node.node, isinstance(node, Repeat1))
+            self.gen.counting_loops.add(name)
+            comma = "," if isinstance(node, Repeat0) else ""
+            self.cache[key] = name, f"self.{name}(){comma}"
+        return self.cache[key]
+
+    def lookahead_call(self, node: Lookahead, negative: bool) -> str:
+        """Return a test of a lookahead, which leaves the position unchanged.
+
+        Lookaheads on single tokens test the next token directly; others
+        call their item between a mark and a reset.
+        """
+        item = _unwrap(node.node)
+        if isinstance(item, Repeat1):
+            item = item.node  # x+ matches if x does.
+        tokens = self.gen.lookahead_tokens(item)
+        if tokens is not None:
+            return self.gen.token_test(*tokens, "_next", "self._tokenizer.peek()", negative)
+        name, call = self.visit(item)
+        if call.endswith(","):
+            return "False" if negative else "True"  # x* and [x] always match.
+        mark, reset = ("_mark", "_reset") if self.gen.inline_memo else ("self.mark", "self.reset")
+        # The item may have moved even if it returned a false value.
+        save = f"(_lookahead := {mark}()) is not None"
+        if negative:
+            return f"({save} and not ({call} or {reset}(_lookahead)))"
+        return f"({save} and {call} and not {reset}(_lookahead))"
 
     def visit_PositiveLookahead(self, node: PositiveLookahead) -> Tuple[None, str]:
-        head, tail = self.lookahead_call_helper(node)
-        return None, f"self.positive_lookahead({head}, {tail})"
+        return None, self.lookahead_call(node, False)
 
     def visit_NegativeLookahead(self, node: NegativeLookahead) -> Tuple[None, str]:
-        head, tail = self.lookahead_call_helper(node)
-        return None, f"self.negative_lookahead({head}, {tail})"
+        return None, self.lookahead_call(node, True)
 
     def visit_Opt(self, node: Opt) -> Tuple[str, str]:
         name, call = self.visit(node.node)
@@ -126,24 +222,82 @@ class PythonCallMakerVisitor(GrammarVisitor):
         return self.visit(node.rhs)
 
     def visit_Cut(self, node: Cut) -> Tuple[str, str]:
+        if self.gen.prune:
+            return "cut", "self.cut(mark)"
         return "cut", "True"
 
 
 class PythonParserGenerator(ParserGenerator, GrammarVisitor):
+    callmakervisitor: PythonCallMakerVisitor
+
     def __init__(
         self,
         grammar: grammar.Grammar,
         file: Optional[IO[Text]],
         tokens: Dict[int, str] = token.tok_name,
+        *,
+        memoize_all: bool = True,
+        memo_plan: Optional[AbstractSet[str]] = None,
+        prune: bool = False,
+        inline_memo: bool = False,
+        first_set_guards: bool = False,
+        optimize: bool = False,
+        left_factor: bool = False,
+        skip_actions: bool = False,
     ):
+        if optimize:
+            # Rules in a memo plan keep their memoization.
+            grammar = optimize_grammar(grammar, memo_plan or frozenset())
         super().__init__(grammar, tokens, file)
         self.callmakervisitor = PythonCallMakerVisitor(self)
+        # If false, only rules flagged with (memo) are memoized
+        # (left-recursion leaders always are).
+        self.memoize_all = memoize_all
+        # If given, the names of the rules to memoize, overriding memoize_all
+        # (see pegen.parser.MemoStats.write_plan()).
+        self.memo_plan = memo_plan
+        # If true, discard memo entries after cuts, and memo entries and
+        # tokens between top-level statements (see Parser.commit()).
+        self.prune = prune
+        self.commit_loops: Set[str] = set()  # Loops calling Parser.commit()
+        # Loops and gathers whose value is not used, which count their
+        # items instead of collecting them.
+        self.counting_loops: Set[str] = set()
+        # If true, memoized rules probe and fill the memo table themselves
+        # instead of going through @memoize, and all rules bind self.mark
+        # and self.reset to locals.
+        self.inline_memo = inline_memo
+        self.memo_id: Optional[int] = None  # Rule id while inlining its memoization
+        # If true, alternatives and helper calls are skipped when the next
+        # token is not in their FIRST set.
+        self.first_set_guards = first_set_guards
+        self.token_types = {name: type for type, name in tokens.items()}
+        if first_set_guards:
+            self.guard_sets = GuardSetCalculator(
+                self.rules,
+                {name for name in TYPED_TOKENS + EXPECTED_TOKENS if name in self.token_types},
+            )
+        # If true, items shared by the start of consecutive alternatives
+        # are parsed once (see visit_factored_alts()).
+        self.left_factor = left_factor
+        # If true, generate a recognizer: rules return True instead of
+        # evaluating their actions, loops count their items, and no item
+        # is bound to a variable (except cuts).
+        self.skip_actions = skip_actions
+        self.default_result = self.grammar.metas.get("default_result") or "list"
+        if self.default_result not in DEFAULT_RESULTS:
+            raise GrammarError(
+                f"Invalid @default_result {self.default_result!r}, "
+                f"expected one of {', '.join(DEFAULT_RESULTS)}"
+            )
 
     def generate(self, filename: str) -> None:
-        header = self.grammar.metas.get("header", MODULE_PREFIX)
+        # A recognizer does not need the code of the actions' module.
+        metas = {} if self.skip_actions else self.grammar.metas
+        header = metas.get("header", MODULE_PREFIX)
         if header is not None:
             self.print(header.rstrip("\n").format(filename=filename))
-        subheader = self.grammar.metas.get("subheader", "")
+        subheader = metas.get("subheader", "")
         if subheader:
             self.print(subheader.format(filename=filename))
         self.print("class GeneratedParser(Parser):")
@@ -153,89 +307,455 @@ class PythonParserGenerator(ParserGenerator, GrammarVisitor):
                 self.print()
                 with self.indent():
                     self.visit(rule)
-        trailer = self.grammar.metas.get("trailer", MODULE_SUFFIX)
+        trailer = metas.get("trailer", MODULE_SUFFIX)
         if trailer is not None:
             self.print(trailer.rstrip("\n"))
 
+    def should_memoize(self, node: Rule) -> bool:
+        if self.memo_plan is not None:
+            return node.name in self.memo_plan
+        return self.memoize_all or node.memo
+
+    def collect_commit_loops(self, node: Rule) -> None:
+        """Find the top-level statement loops of the start rule.
+
+        Nothing can backtrack before an iteration of a loop in the start
+        rule, provided that the start rule has a single alternative and
+        is never invoked from another rule.
+        """
+        rhs = node.flatten()
+        if (
+            node.name != "start"
+            or node.left_recursive
+            or len(rhs.alts) != 1
+            or "start" in self.referenced_rules()
+        ):
+            return
+        alt = rhs.alts[0]
+        for item in alt.items:
+            if isinstance(item.item, (Repeat0, Repeat1)):
+                name, call = self.item_call(item, _value_unused(item, alt))
+                assert name is not None  # Repeats call a helper rule.
+                self.commit_loops.add(name)
+
     def visit_Rule(self, node: Rule) -> None:
         is_loop = node.is_loop()
         is_gather = node.is_gather()
+        is_counting = node.name in self.counting_loops or self.skip_actions
+        children = "_count" if is_counting else "children"
         rhs = node.flatten()
+        if self.prune:
+            self.collect_commit_loops(node)
         if node.left_recursive:
             if node.leader:
-                self.print("@memoize_left_rec")
+                self.print(f"@memoize_left_rec({self.rule_id()})")
             else:
                 # Non-leader rules in a cycle are not memoized,
                 # but they must still be logged.
                 self.print("@logger")
+        elif self.should_memoize(node):
+            if self.inline_memo:
+                self.memo_id = self.rule_id()
+                self.print(f"@memoize_inline({self.memo_id})")
+            else:
+                self.print(f"@memoize({self.rule_id()})")
         else:
-            self.print("@memoize")
-        node_type = node.type or "Any"
+            # Unmemoized rules are still logged.
+            self.print("@logger")
+        if self.skip_actions:
+            node_type = "int" if is_loop or is_gather else "bool"
+        else:
+            node_type = node.type or "Any"
         self.print(f"def {node.name}(self) -> Optional[{node_type}]:")
         with self.indent():
             self.print(f"# {node.name}: {rhs}")
             if node.nullable:
                 self.print(f"# nullable={node.nullable}")
-            self.print("mark = self.mark()")
-            if is_loop:
-                self.print("children = []")
-            self.visit(rhs, is_loop=is_loop, is_gather=is_gather)
-            if is_loop:
-                self.print("return children")
+            if self.inline_memo:
+                self.print("_mark, _reset = self.mark, self.reset")
+                self.print("mark = _mark()")
+            else:
+                self.print("mark = self.mark()")
+            if self.memo_id is not None:
+                self.print("_memo = self._memo")
+                self.print("_slot = _memo[mark] if mark < len(_memo) else self._memo_slot(mark)")
+                self.print(f"_entry = _slot.get({self.memo_id})")
+                self.print("if _entry is not None:")
+                with self.indent():
+                    self.print("_reset(_entry[1])")
+                    self.print("return _entry[0]")
+            if is_gather:
+                gather = rhs.alts[0].items[0].item
+                assert isinstance(gather, Gather)
+                self.print_gather(gather, is_counting)
             else:
-                self.print("return None")
+                if is_loop:
+                    self.print(f"{children} = {0 if is_counting else []}")
+                elif any(self.guard_expr(alt, "_tok") is not None for alt in rhs.alts):
+                    # Failing alternatives reset to mark, so this is the next
+                    # token for every alternative.
+                    self.print("_tok = self._tokenizer.peek()")
+                self.visit(
+                    rhs,
+                    is_loop=is_loop,
+                    is_commit_loop=node.name in self.commit_loops,
+                    is_counting=is_counting,
+                )
+            self.print_return(children if is_loop else "None")
+        self.memo_id = None
+
+    def print_gather(self, node: Gather, is_counting: bool) -> None:
+        """Print the body of a gather helper, appending to the list of elements."""
+        children = "_count" if is_counting else "children"
+        with self.local_variable_context():
+            self.print("if (")
+            with self.indent():
+                # Callers only call the helper if the next token may start an element.
+                self.visit(NamedItem("elem", node.node), guarded=True)
+                self.print("is not None")
+            self.print("):")
+            with self.indent():
+                self.print(f"{children} = {1 if is_counting else '[elem]'}")
+                self.print(f"mark = {'_mark' if self.inline_memo else 'self.mark'}()")
+                loop = Alt(
+                    [NamedItem(None, node.separator), NamedItem("elem", node.node)], action="elem"
+                )
+                self.visit(loop, is_loop=True, is_counting=is_counting)
+                self.print_return(children)
+            self.print(f"{'_reset' if self.inline_memo else 'self.reset'}(mark)")
 
-    def visit_NamedItem(self, node: NamedItem) -> None:
-        name, call = self.callmakervisitor.visit(node.item)
+    def guard_expr(self, node: object, tok: str, fetch: Optional[str] = None) -> Optional[str]:
+        """Return a test that the next token can start node, or None if it always can.
+
+        The test reads the token from the variable tok; if fetch is given,
+        the first reference to the token is (tok := fetch) instead.
+        """
+        if not self.first_set_guards:
+            return None
+        first = self.guard_sets.guard(node)
+        if first is None:
+            return None
+        types: Set[int] = set()
+        strings: Set[str] = set()
+        for terminal in first:
+            if terminal in self.token_types:
+                types.add(self.token_types[terminal])
+                if terminal in EXPECTED_TOKENS:
+                    strings.add(terminal)
+                continue
+            # A string literal: see Parser.expect() for what it matches.
+            string = ast.literal_eval(terminal)
+            strings.add(string)
+            if string in token.EXACT_TOKEN_TYPES:
+                types.add(token.EXACT_TOKEN_TYPES[string])
+            elif string in self.token_types:
+                types.add(self.token_types[string])
+        return self.token_test(types, strings, tok, fetch)
+
+    def token_test(
+        self,
+        types: AbstractSet[int],
+        strings: AbstractSet[str],
+        tok: str,
+        fetch: Optional[str] = None,
+        negative: bool = False,
+    ) -> str:
+        """Return a test that the token in tok has one of types or strings.
+
+        If negative is true, the test is that it has none of them instead.
+        See guard_expr() for tok and fetch.
+        """
+        # Triples of a token attribute, an operator and a value.
+        tests: List[Tuple[str, str, str]] = []
+        if len(types) == 1:
+            tests.append(("type", "==", str(min(types))))
+        elif types:
+            tests.append(("type", "in", f"{{{', '.join(map(str, sorted(types)))}}}"))
+        if len(strings) == 1:
+            tests.append(("string", "==", repr(min(strings))))
+        elif strings:
+            tests.append(("string", "in", f"{{{', '.join(map(repr, sorted(strings)))}}}"))
+        if not tests:
+            return "True" if negative else "False"  # Nothing can match.
+        if fetch and len(tests) == 1:
+            first_tok = fetch  # The token is only read once.
+        else:
+            first_tok = f"({tok} := {fetch})" if fetch else tok
+        exprs = []
+        for i, (attribute, operator, value) in enumerate(tests):
+            if negative:
+                operator = "!=" if operator == "==" else "not in"
+            exprs.append(f"{first_tok if i == 0 else tok}.{attribute} {operator} {value}")
+        if len(exprs) == 1:
+            return exprs[0]
+        return f"({(' and ' if negative else ' or ').join(exprs)})"
+
+    def lookahead_tokens(
+        self, node: Any, seen: AbstractSet[str] = frozenset()
+    ) -> Optional[Tuple[Set[int], Set[str]]]:
+        """Return the token types and strings of the tokens node matches.
+
+        Return None unless node always matches a single token, that is for
+        terminals, and for alternatives (or rules) of terminals without
+        actions.
+        """
+        node = _unwrap(node)
+        if isinstance(node, StringLeaf):
+            value = ast.literal_eval(node.value)
+            if isinstance(token.__dict__.get(value), int):
+                # See Parser.expect().
+                return {token.__dict__[value]}, {value}
+            return set(), {value}
+        if isinstance(node, NameLeaf):
+            name = node.value
+            # See PythonCallMakerVisitor.visit_NameLeaf().
+            if name in TYPED_TOKENS:
+                return {getattr(token, name)}, set()
+            if name in EXPECTED_TOKENS:
+                return {getattr(token, name)}, {name}
+            if name not in self.rules or name in seen:
+                return None
+            node = self.rules[name].rhs
+            seen = seen | {name}
+        if not isinstance(node, Rhs):
+            return None
+        types: Set[int] = set()
+        strings: Set[str] = set()
+        for alt in node.alts:
+            # An action might return a false value, failing the match.
+            if len(alt.items) != 1 or (alt.action and not self.skip_actions):
+                return None
+            tokens = self.lookahead_tokens(alt.items[0].item, seen)
+            if tokens is None:
+                return None
+            types |= tokens[0]
+            strings |= tokens[1]
+        return types, strings
+
+    def guard_helper_call(self, node: object, call: str) -> str:
+        """Skip calling the helper rule in call when node cannot start with the next token."""
+        match = HELPER_CALL_RE.search(call)
+        if not match:
+            return call
+        if isinstance(node, (Opt, Lookahead)):
+            node = node.node
+        if isinstance(node, (Repeat0, Repeat1, Gather)):
+            node = node.node
+        guard = self.guard_expr(node, "_next", "self._tokenizer.peek()")
+        if guard is None:
+            return call
+        failure = HELPER_FAILURE[match.group(1)]
+        guarded = f"({match.group()} if {guard} else {failure})"
+        return call[: match.start()] + guarded + call[match.end() :]
+
+    def print_return(self, value: str) -> None:
+        """Print a return statement, storing the result when inlining memoization."""
+        if self.memo_id is None:
+            self.print(f"return {value}")
+        elif value == "None":
+            # Failing alternatives always reset to the start mark.
+            self.print(f"_slot[{self.memo_id}] = None, mark")
+            self.print("return None")
+        else:
+            self.print(f"_tree = {value}")
+            self.print(f"_slot[{self.memo_id}] = _tree, _mark()")
+            self.print("return _tree")
+
+    def item_call(self, node: NamedItem, unused: bool = False) -> Tuple[Optional[str], str]:
+        if unused or self.skip_actions:
+            return self.callmakervisitor.visit_unused(node.item)
+        return self.callmakervisitor.visit(node.item)
+
+    def visit_NamedItem(
+        self, node: NamedItem, guarded: bool = False, unused: bool = False
+    ) -> None:
+        name, call = self.item_call(node, unused)
+        if not guarded:
+            call = self.guard_helper_call(node.item, call)
         if node.name:
             name = node.name
+        if self.skip_actions and name != "cut":
+            name = None
         if not name:
-            self.print(call)
+            self.print(f"({call[:-1]} or True)" if call.endswith(",") else call)
         else:
             if name != "cut":
                 name = self.dedupe(name)
-            self.print(f"({name} := {call})")
+            if call.endswith(","):
+                # An optional item always matches: rather than making a
+                # one-element tuple, force the test to be true.
+                self.print(f"(({name} := {call[:-1]}) or True)")
+            else:
+                self.print(f"({name} := {call})")
 
-    def visit_Rhs(self, node: Rhs, is_loop: bool = False, is_gather: bool = False) -> None:
+    def alt_result(self, node: Alt) -> str:
+        """Return the result of an alternative (other than a loop's)."""
+        if self.skip_actions:
+            return "True"
+        return node.action or self.default_action()
+
+    def default_action(self) -> str:
+        """Return the result of an alternative without an action.
+
+        It is built from the variables of the alternative, as set by the
+        default_result meta: a list (the default), a tuple, or (single) a
+        tuple unless there is a single variable, whose value is returned.
+        """
+        names = self.local_variable_names
+        if self.default_result == "list":
+            return f"[{', '.join(names)}]"
+        if len(names) == 1:
+            return names[0] if self.default_result == "single" else f"({names[0]},)"
+        return f"({', '.join(names)})"
+
+    def visit_Rhs(
+        self,
+        node: Rhs,
+        is_loop: bool = False,
+        is_commit_loop: bool = False,
+        is_counting: bool = False,
+    ) -> None:
         if is_loop:
             assert len(node.alts) == 1
+        elif self.left_factor:
+            self.visit_factored_alts(node.alts)
+            return
         for alt in node.alts:
-            self.visit(alt, is_loop=is_loop, is_gather=is_gather)
+            self.visit(
+                alt, is_loop=is_loop, is_commit_loop=is_commit_loop, is_counting=is_counting
+            )
 
-    def visit_Alt(self, node: Alt, is_loop: bool, is_gather: bool) -> None:
+    def factor_alts(self, alts: List[Alt], offset: int) -> List[Tuple[List[Alt], int]]:
+        """Group consecutive alternatives sharing the items that follow offset.
+
+        Return (alternatives, length) pairs, where length is the number of
+        items shared after offset (0 for an alternative on its own).
+        Alternatives with cuts are never grouped.
+        """
+        groups: List[Tuple[List[Alt], int]] = []
+        for alt in alts:
+            if groups and not _has_cut(alt):
+                group, length = groups[-1]
+                common = _common_prefix(group[0], alt, offset)
+                if common and not _has_cut(group[0]):
+                    groups[-1] = group + [alt], min(common, length) if length else common
+                    continue
+            groups.append(([alt], 0))
+        return groups
+
+    def visit_factored_alts(
+        self, alts: List[Alt], offset: int = 0, names: Iterable[str] = (), mark: str = "mark"
+    ) -> None:
+        """Print alternatives, parsing their shared leading items once.
+
+        The items up to offset, binding names, have been parsed, and mark
+        is the position after them.  Each group of alternatives sharing
+        more items is printed as a test of the shared items, nesting the
+        tests of their remaining items.  Since the shared items match (or
+        fail) the same way for every alternative of the group, the ordered
+        choice is unchanged.
+        """
+        reset = "_reset" if self.inline_memo else "self.reset"
+        for group, length in self.factor_alts(alts, offset):
+            if offset == 0 and length == 0:
+                self.visit(group[0], is_loop=False)
+                continue
+            with self.local_variable_context(names):
+                alt = group[0]
+                items = alt.items[offset : offset + length] if length else alt.items[offset:]
+                if not items:
+                    # The shared items are the whole alternative, which
+                    # cannot fail from here: later ones are unreachable.
+                    self.print_return(self.alt_result(alt))
+                    return
+                self.print("if (")
+                with self.indent():
+                    guard = self.guard_expr(Rhs(group), "_tok") if offset == 0 else None
+                    if guard is not None:
+                        self.print(guard)
+                    for i, item in enumerate(items):
+                        if i or guard is not None:
+                            self.print("and")
+                        unused = all(
+                            _value_unused(other.items[offset + i], other) for other in group
+                        )
+                        self.visit(item, guarded=i == 0 and guard is not None, unused=unused)
+                self.print("):")
+                with self.indent():
+                    if length:
+                        position = f"_pos{offset + length}"
+                        mark_call = "_mark()" if self.inline_memo else "self.mark()"
+                        self.print(f"{position} = {mark_call}")
+                        self.visit_factored_alts(
+                            group, offset + length, list(self.local_variable_names), position
+                        )
+                    else:
+                        self.print_return(self.alt_result(alt))
+                self.print(f"{reset}({mark})")
+
+    def visit_Alt(
+        self,
+        node: Alt,
+        is_loop: bool,
+        is_commit_loop: bool = False,
+        is_counting: bool = False,
+    ) -> None:
+        has_cut = _has_cut(node)
         with self.local_variable_context():
-            self.print("cut = False")  # TODO: Only if needed.
+            if has_cut:
+                self.print("cut = False")
             if is_loop:
                 self.print("while (")
+                guard = self.guard_expr(node, "_next", "self._tokenizer.peek()")
             else:
                 self.print("if (")
+                guard = self.guard_expr(node, "_tok")
             with self.indent():
                 first = True
-                for item in node.items:
+                if guard is not None:
+                    self.print(guard)
+                    first = False
+                for i, item in enumerate(node.items):
                     if first:
                         first = False
                     else:
                         self.print("and")
-                    self.visit(item)
-                    if is_gather:
-                        self.print("is not None")
+                    # The alternative's guard already covers its first item.
+                    self.visit(
+                        item,
+                        guarded=i == 0 and guard is not None,
+                        unused=_value_unused(item, node),
+                    )
 
             self.print("):")
             with self.indent():
-                action = node.action
-                if not action:
-                    if is_gather:
-                        assert len(self.local_variable_names) == 2
-                        action = (
-                            f"[{self.local_variable_names[0]}] + {self.local_variable_names[1]}"
-                        )
-                    else:
-                        action = f"[{', '.join(self.local_variable_names)}]"
                 if is_loop:
-                    self.print(f"children.append({action})")
-                    self.print(f"mark = self.mark()")
+                    if is_counting:
+                        self.print("_count += 1")
+                    else:
+                        action = node.action
+                        if not action and len(self.local_variable_names) == 1:
+                            # Loops collect their items themselves.
+                            action = self.local_variable_names[0]
+                        self.print(f"children.append({action or self.default_action()})")
+                    if self.inline_memo:
+                        self.print("mark = _mark()")
+                    else:
+                        self.print(f"mark = self.mark()")
+                    if is_commit_loop:
+                        # commit() renumbers the tokens.
+                        self.print("self.commit(mark)")
+                        self.print("mark = _mark()" if self.inline_memo else "mark = self.mark()")
                 else:
-                    self.print(f"return {action}")
-            self.print("self.reset(mark)")
+                    self.print_return(self.alt_result(node))
+            if self.inline_memo:
+                self.print("_reset(mark)")
+            else:
+                self.print("self.reset(mark)")
             # Skip remaining alternatives if a cut was reached.
-            self.print("if cut: return None")  # TODO: Only if needed.
+            if has_cut and self.memo_id is None:
+                self.print("if cut: return None")
+            elif has_cut:
+                self.print("if cut:")
+                with self.indent():
+                    self.print_return("None")
@@ -0,0 +1,151 @@
+"""An on-disk cache of token streams, keyed by source content.
+
+A cache file holds the significant tokens of one source (those kept by
+Tokenizer) as fixed-size binary records.  Token strings and lines are
+stored as offsets into the source text, which the caller already has,
+so loading a cached stream only slices the source.
+
+Usage:
+
+    cache = TokenCache(".pegen-tokens")
+    tokenizer = Tokenizer(cache.generate_tokens(source))
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import tokenize
+from typing import Iterator, List, Optional
+
+from pegen.tokenizer import generate_source_tokens
+
+# Bump when the record layout or the tokenization itself changes.
+FORMAT_VERSION = 1
+
+_MAGIC = b"PEGENTOK"
+_HEADER = struct.Struct("<8sQ")  # Magic, number of tokens
+# Type, start row and column, end row and column, string offset and
+# length, line offset and length.
+_RECORD = struct.Struct("<BIIIIIIII")
+
+
+class TokenCache:
+    """Token streams stored in a directory, keyed by a hash of the source.
+
+    Several processes can share a directory: files are written under a
+    temporary name and renamed into place, so readers never see a
+    partial file.  Unreadable files are treated as misses.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source: str) -> str:
+        """Return the cache file path for a source."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{FORMAT_VERSION} {sys.version_info[:2]}\n".encode())
+        digest.update(source.encode("utf-8", "surrogatepass"))
+        return os.path.join(self.directory, digest.hexdigest() + ".tok")
+
+    def generate_tokens(self, source: str) -> Iterator[tokenize.TokenInfo]:
+        """Return the tokens of source, like generate_source_tokens().
+
+        On a miss the source is tokenized and the result stored, unless
+        tokenizing fails: then the tokens are produced lazily, up to the
+        error, exactly as without a cache.
+        """
+        path = self.path(source)
+        tokens = self._load(path, source)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        try:
+            result = list(generate_source_tokens(source))
+        except (SyntaxError, tokenize.TokenError):
+            return generate_source_tokens(source)
+        self._store(path, source, result)
+        return iter(result)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate)"
+
+    def _load(self, path: str, source: str) -> Optional[Iterator[tokenize.TokenInfo]]:
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        with data:
+            if len(data) < _HEADER.size:
+                return None
+            magic, count = _HEADER.unpack_from(data)
+            if magic != _MAGIC or len(data) != _HEADER.size + count * _RECORD.size:
+                return None
+            # Copy the records out, so that the mapping is closed even if
+            # the tokens are not all read.
+            records = data[_HEADER.size :]
+        return self._read_tokens(records, source)
+
+    @staticmethod
+    def _read_tokens(records: bytes, source: str) -> Iterator[tokenize.TokenInfo]:
+        TokenInfo = tokenize.TokenInfo
+        new_token = tuple.__new__
+        last_line = (-1, 0)
+        line = ""
+        for type, srow, scol, erow, ecol, soff, slen, loff, llen in _RECORD.iter_unpack(records):
+            if (loff, llen) != last_line:
+                # Consecutive tokens of a line share its string.
+                last_line = loff, llen
+                line = source[loff : loff + llen]
+            yield new_token(
+                TokenInfo,
+                (type, source[soff : soff + slen], (srow, scol), (erow, ecol), line),
+            )
+
+    def _store(self, path: str, source: str, tokens: List[tokenize.TokenInfo]) -> None:
+        # Offsets of the line starts, indexed by row (rows start at 1,
+        # and the end of the source counts as one more row).
+        line_starts = [0, 0]
+        index = source.find("\n")
+        while index >= 0:
+            line_starts.append(index + 1)
+            index = source.find("\n", index + 1)
+        line_starts += [len(source), len(source)]
+        records = [_HEADER.pack(_MAGIC, len(tokens))]
+        for tok in tokens:
+            (srow, scol), (erow, ecol) = tok.start, tok.end
+            soff = loff = line_starts[srow]
+            soff += scol
+            if not tok.line:
+                loff = 0
+            # Every string and line is a slice of the source; check it.
+            if (
+                source[soff : soff + len(tok.string)] != tok.string
+                or source[loff : loff + len(tok.line)] != tok.line
+            ):
+                return
+            records.append(
+                _RECORD.pack(
+                    tok.type, srow, scol, erow, ecol, soff, len(tok.string), loff, len(tok.line)
+                )
+            )
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(b"".join(records))
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
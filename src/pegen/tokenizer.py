@@ -1,6 +1,13 @@
+import bisect
+import io
+import itertools
+import mmap
+import re
+import sys
 import token
 import tokenize
-from typing import Iterator, List
+from array import array
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional, Tuple, Union, cast
 
 Mark = int  # NewType('Mark', int)
 
@@ -11,6 +18,254 @@ def shorttok(tok: tokenize.TokenInfo) -> str:
     return "%-25.25s" % f"{tok.start[0]}.{tok.start[1]}: {token.tok_name[tok.type]}:{tok.string!r}"
 
 
+def shift_token(tok: tokenize.TokenInfo, rows: int) -> tokenize.TokenInfo:
+    """Return tok moved down by rows rows."""
+    type, string, (srow, scol), (erow, ecol), line = tok
+    # Bypass the slower TokenInfo.__new__().
+    return tuple.__new__(
+        tokenize.TokenInfo, (type, string, (srow + rows, scol), (erow + rows, ecol), line)
+    )
+
+
+# The patterns of the tokenize module, compiled once.
+_pseudo_token = re.compile(tokenize.PseudoToken)
+_end_patterns = {
+    prefix: re.compile(pattern)
+    for prefix, pattern in tokenize.endpats.items()
+    if pattern is not None
+}
+_single_quoted = tokenize.single_quoted
+_triple_quoted = tokenize.triple_quoted
+
+
+def read_source(file: BinaryIO) -> str:
+    """Read and decode a whole source file like tokenize.tokenize() would.
+
+    The encoding comes from a BOM or a PEP 263 coding cookie (see
+    tokenize.detect_encoding()), and line endings are kept as they are.
+    Regular files are memory-mapped and decoded in a single step instead
+    of being read into an intermediate bytes object.
+    """
+    data: Union[bytes, mmap.mmap]
+    try:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        # Empty files, pipes and in-memory streams cannot be mapped.
+        data = file.read()
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+        return str(data, encoding)
+    with data:
+        encoding, _ = tokenize.detect_encoding(data.readline)
+        return str(data, encoding)
+
+
+def _source_lines(source: str, offset: int) -> Iterator[str]:
+    """Yield the lines of source from offset on, like readline() would.
+
+    The last line may lack its newline, and an empty line marks the end
+    of the input.
+    """
+    find = source.find
+    end = find("\n", offset) + 1
+    while end:
+        yield source[offset:end]
+        offset = end
+        end = find("\n", offset) + 1
+    if offset < len(source):
+        yield source[offset:]
+    yield ""
+
+
+def generate_source_tokens(
+    source: str, offset: int = 0, row: int = 1
+) -> Iterator[tokenize.TokenInfo]:
+    """Tokenize a whole source string in one pass.
+
+    This yields the same tokens as tokenize.generate_tokens() reading
+    the source line by line, except for the tokens Tokenizer skips: NL,
+    COMMENT and whitespace ERRORTOKEN tokens are never created.  Errors
+    raise the same exceptions.
+
+    Tokenizing can also start at the line beginning at offset, numbered
+    row; the lines before it must end a statement at indentation 0.
+    """
+    return cast(Iterator[tokenize.TokenInfo], _generate_tokens(_source_lines(source, offset), row))
+
+
+def generate_line_tokens(readline: Callable[[], str]) -> Iterator[tokenize.TokenInfo]:
+    """Tokenize lines as readline() returns them, like generate_source_tokens().
+
+    Only the current line is kept, so this can tokenize files of any size.
+    """
+    lines = itertools.chain(iter(readline, ""), ("",))
+    return cast(Iterator[tokenize.TokenInfo], _generate_tokens(lines))
+
+
+def _generate_tokens(
+    lines: Iterator[Optional[str]], row: int = 1
+) -> Iterator[Optional[tokenize.TokenInfo]]:
+    """Tokenize lines, the first numbered row, ending with an empty line.
+
+    A None line means that the next line is not available yet: None is
+    yielded, and the line is read again on the next call.
+    """
+    TokenInfo = tokenize.TokenInfo
+    new_token = tuple.__new__  # Skips the argument handling of TokenInfo()
+    NAME, NUMBER, STRING, OP = token.NAME, token.NUMBER, token.STRING, token.OP
+    NEWLINE, ERRORTOKEN = token.NEWLINE, token.ERRORTOKEN
+    match_pseudo = _pseudo_token.match
+    tabsize = tokenize.tabsize
+
+    lnum = row - 1
+    parenlev = continued = 0
+    contstr, needcont = "", False
+    contline = ""
+    strstart = (0, 0)
+    endprog = _pseudo_token
+    indents = [0]
+    last_line = line = ""
+    for next_line in lines:
+        if next_line is None:
+            yield None
+            continue
+        line = next_line
+        lnum += 1
+        pos, max = 0, len(line)
+
+        if contstr:  # Continued string
+            if not line:
+                raise tokenize.TokenError("EOF in multi-line string", strstart)
+            endmatch = endprog.match(line)
+            if endmatch:
+                pos = end = endmatch.end(0)
+                yield TokenInfo(
+                    STRING, contstr + line[:end], strstart, (lnum, end), contline + line
+                )
+                contstr, needcont = "", False
+                contline = ""
+            elif needcont and line[-2:] != "\\\n" and line[-3:] != "\\\r\n":
+                yield TokenInfo(ERRORTOKEN, contstr + line, strstart, (lnum, len(line)), contline)
+                contstr = ""
+                contline = ""
+                last_line = line
+                continue
+            else:
+                contstr = contstr + line
+                contline = contline + line
+                last_line = line
+                continue
+
+        elif parenlev == 0 and not continued:  # New statement
+            if not line:
+                break
+            column = 0
+            while pos < max:  # Measure leading whitespace
+                char = line[pos]
+                if char == " ":
+                    column += 1
+                elif char == "\t":
+                    column = (column // tabsize + 1) * tabsize
+                elif char == "\f":
+                    column = 0
+                else:
+                    break
+                pos += 1
+            if pos == max:
+                break
+            if line[pos] in "#\r\n":  # Skip comments and blank lines
+                last_line = line
+                continue
+
+            if column > indents[-1]:  # Count indents and dedents
+                indents.append(column)
+                yield TokenInfo(token.INDENT, line[:pos], (lnum, 0), (lnum, pos), line)
+            while column < indents[-1]:
+                if column not in indents:
+                    raise IndentationError(
+                        "unindent does not match any outer indentation level",
+                        ("<tokenize>", lnum, pos, line),
+                    )
+                indents.pop()
+                yield TokenInfo(token.DEDENT, "", (lnum, pos), (lnum, pos), line)
+
+        else:  # Continued statement
+            if not line:
+                raise tokenize.TokenError("EOF in multi-line statement", (lnum, 0))
+            continued = 0
+
+        while pos < max:
+            pseudomatch = match_pseudo(line, pos)
+            if pseudomatch:
+                start, end = pseudomatch.span(1)
+                pos = end
+                if start == end:
+                    continue
+                text, initial = line[start:end], line[start]
+
+                if initial in "0123456789" or (initial == "." and text != "." and text != "..."):
+                    yield new_token(TokenInfo, (NUMBER, text, (lnum, start), (lnum, end), line))
+                elif initial in "\r\n":
+                    if parenlev == 0:
+                        yield new_token(
+                            TokenInfo, (NEWLINE, text, (lnum, start), (lnum, end), line)
+                        )
+                elif initial == "#":
+                    pass
+                elif text in _triple_quoted:
+                    endprog = _end_patterns[text]
+                    endmatch = endprog.match(line, pos)
+                    if endmatch:  # All on one line
+                        pos = endmatch.end(0)
+                        text = line[start:pos]
+                        yield new_token(
+                            TokenInfo, (STRING, text, (lnum, start), (lnum, pos), line)
+                        )
+                    else:  # Multiple lines
+                        strstart = (lnum, start)
+                        contstr = line[start:]
+                        contline = line
+                        break
+                elif (
+                    initial in _single_quoted
+                    or text[:2] in _single_quoted
+                    or text[:3] in _single_quoted
+                ):
+                    if text[-1] == "\n":  # Continued string
+                        strstart = (lnum, start)
+                        endprog = (
+                            _end_patterns.get(initial)
+                            or _end_patterns.get(text[1])
+                            or _end_patterns[text[2]]
+                        )
+                        contstr, needcont = line[start:], True
+                        contline = line
+                        break
+                    yield new_token(TokenInfo, (STRING, text, (lnum, start), (lnum, end), line))
+                elif initial.isidentifier():
+                    yield new_token(TokenInfo, (NAME, text, (lnum, start), (lnum, end), line))
+                elif initial == "\\":  # Continued statement
+                    continued = 1
+                else:
+                    if initial in "([{":
+                        parenlev += 1
+                    elif initial in ")]}":
+                        parenlev -= 1
+                    yield new_token(TokenInfo, (OP, text, (lnum, start), (lnum, end), line))
+            else:
+                if not line[pos].isspace():
+                    yield TokenInfo(ERRORTOKEN, line[pos], (lnum, pos), (lnum, pos + 1), line)
+                pos += 1
+        last_line = line
+
+    # Add an implicit NEWLINE if the input doesn't end in one
+    if last_line and last_line[-1] not in "\r\n" and not last_line.strip().startswith("#"):
+        end = len(last_line)
+        yield TokenInfo(NEWLINE, "", (lnum - 1, end), (lnum - 1, end + 1), "")
+    for _ in indents[1:]:  # Pop remaining indent levels
+        yield TokenInfo(token.DEDENT, "", (lnum, 0), (lnum, 0), "")
+    yield TokenInfo(token.ENDMARKER, "", (lnum, 0), (lnum, 0), "")
+
+
 class Tokenizer:
     """Caching wrapper for the tokenize module.
 
@@ -23,12 +278,40 @@ class Tokenizer:
         self._tokengen = tokengen
         self._tokens = []
         self._index = 0
+        # Tokens before this mark have been released (see release()).
+        self._floor = 0
         self._verbose = verbose
         if verbose:
+            # Only verbose tokenizers pay for reporting.
+            self.getnext = self._verbose_getnext  # type: ignore
+            self.reset = self._verbose_reset  # type: ignore
+            self.match_type = self._verbose_match_type  # type: ignore
+            self.match_string = self._verbose_match_string  # type: ignore
+            self.report(False, False)
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        """Start over on the tokens of another input, forgetting those read so far."""
+        self._tokengen = tokengen
+        self._tokens.clear()
+        self._index = 0
+        self._floor = 0
+        if self._verbose:
             self.report(False, False)
 
     def getnext(self) -> tokenize.TokenInfo:
         """Return the next token and updates the index."""
+        while self._index == len(self._tokens):
+            tok = next(self._tokengen)
+            if tok.type in (tokenize.NL, tokenize.COMMENT):
+                continue
+            if tok.type == token.ERRORTOKEN and tok.string.isspace():
+                continue
+            self._tokens.append(tok)
+        tok = self._tokens[self._index]
+        self._index += 1
+        return tok
+
+    def _verbose_getnext(self) -> tokenize.TokenInfo:
         cached = True
         while self._index == len(self._tokens):
             tok = next(self._tokengen)
@@ -40,8 +323,7 @@ class Tokenizer:
             cached = False
         tok = self._tokens[self._index]
         self._index += 1
-        if self._verbose:
-            self.report(cached, False)
+        self.report(cached, False)
         return tok
 
     def peek(self) -> tokenize.TokenInfo:
@@ -55,6 +337,38 @@ class Tokenizer:
             self._tokens.append(tok)
         return self._tokens[self._index]
 
+    def match_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if it has the given type."""
+        index = self._index
+        if index == len(self._tokens):
+            self.peek()
+        tok = self._tokens[index]
+        if tok.type == type:
+            self._index = index + 1
+            return tok
+        return None
+
+    def _verbose_match_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+        if self.peek().type == type:
+            return self.getnext()
+        return None
+
+    def match_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if its string is string."""
+        index = self._index
+        if index == len(self._tokens):
+            self.peek()
+        tok = self._tokens[index]
+        if tok.string == string:
+            self._index = index + 1
+            return tok
+        return None
+
+    def _verbose_match_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        if self.peek().string == string:
+            return self.getnext()
+        return None
+
     def diagnose(self) -> tokenize.TokenInfo:
         if not self._tokens:
             self.getnext()
@@ -64,13 +378,38 @@ class Tokenizer:
         return self._index
 
     def reset(self, index: Mark) -> None:
+        assert 0 <= index <= len(self._tokens), (index, len(self._tokens))
+        self._index = index
+
+    def _verbose_reset(self, index: Mark) -> None:
         if index == self._index:
             return
         assert 0 <= index <= len(self._tokens), (index, len(self._tokens))
         old_index = self._index
         self._index = index
-        if self._verbose:
-            self.report(True, index < old_index)
+        self.report(True, index < old_index)
+
+    def release(self, mark: Mark) -> None:
+        """Discard the tokens before mark; they must never be read again.
+
+        The token just before mark is kept, for diagnose() and report().
+        """
+        for index in range(max(self._floor - 1, 0), mark - 1):
+            self._tokens[index] = None  # type: ignore
+        self._floor = max(self._floor, mark)
+
+    def rebase(self, mark: Mark) -> None:
+        """Discard the tokens before mark and renumber the others from 0.
+
+        The token just before mark is kept, for diagnose() and report(),
+        and becomes token 0.  Marks taken before must not be used again.
+        """
+        count = mark - 1
+        if count <= 0:
+            return
+        del self._tokens[:count]
+        self._index -= count
+        self._floor = max(self._floor - count, 0)
 
     def report(self, cached: bool, back: bool) -> None:
         if back:
@@ -84,3 +423,467 @@ class Tokenizer:
         else:
             tok = self._tokens[self._index - 1]
             print(f"{fill} {shorttok(tok)}")
+
+
+class CompactTokenizer(Tokenizer):
+    """Tokenizer storing its tokens in parallel arrays.
+
+    A token costs a few dozen bytes instead of a TokenInfo with its
+    position tuples.  Strings are interned and each physical line is
+    stored once.  TokenInfo objects are only created for the tokens
+    returned by getnext() and peek(), or by match_type() and
+    match_string() when they match.
+    """
+
+    def __init__(self, tokengen: Iterator[tokenize.TokenInfo], *, verbose: bool = False):
+        self._types = array("B")
+        self._strings: List[str] = []
+        self._start_rows = array("I")
+        self._start_cols = array("I")
+        self._end_rows = array("I")
+        self._end_cols = array("I")
+        self._line_ids = array("I")
+        self._lines: List[str] = []
+        # Tokens and lines before these have been released (see release()).
+        self._offset = 0
+        self._line_offset = 0
+        # The last token created, so that repeated peeks share it.
+        self._last: Optional[tokenize.TokenInfo] = None
+        self._last_index = -1
+        super().__init__(tokengen, verbose=verbose)
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        for column in (
+            self._types,
+            self._strings,
+            self._start_rows,
+            self._start_cols,
+            self._end_rows,
+            self._end_cols,
+            self._line_ids,
+        ):
+            del column[:]
+        self._lines.clear()
+        self._offset = 0
+        self._line_offset = 0
+        self._last = None
+        self._last_index = -1
+        super().restart(tokengen)
+
+    def _fetch(self) -> None:
+        """Append the next significant token to the arrays."""
+        while True:
+            tok = next(self._tokengen)
+            if tok.type in (tokenize.NL, tokenize.COMMENT):
+                continue
+            if tok.type == token.ERRORTOKEN and tok.string.isspace():
+                continue
+            break
+        self._types.append(tok.type)
+        self._strings.append(sys.intern(tok.string))
+        self._start_rows.append(tok.start[0])
+        self._start_cols.append(tok.start[1])
+        self._end_rows.append(tok.end[0])
+        self._end_cols.append(tok.end[1])
+        if not self._lines or tok.line is not self._lines[-1]:
+            self._lines.append(tok.line)
+        self._line_ids.append(self._line_offset + len(self._lines) - 1)
+
+    def _token(self, index: Mark) -> tokenize.TokenInfo:
+        """Return the token at index, creating its TokenInfo if needed."""
+        if index == self._last_index:
+            return self._last  # type: ignore
+        i = index - self._offset
+        tok = tokenize.TokenInfo(
+            self._types[i],
+            self._strings[i],
+            (self._start_rows[i], self._start_cols[i]),
+            (self._end_rows[i], self._end_cols[i]),
+            self._lines[self._line_ids[i] - self._line_offset],
+        )
+        self._last = tok
+        self._last_index = index
+        return tok
+
+    def _length(self) -> int:
+        return self._offset + len(self._types)
+
+    def getnext(self) -> tokenize.TokenInfo:
+        """Return the next token and updates the index."""
+        if self._index == self._length():
+            self._fetch()
+        tok = self._token(self._index)
+        self._index += 1
+        return tok
+
+    def _verbose_getnext(self) -> tokenize.TokenInfo:
+        cached = self._index < self._length()
+        tok = CompactTokenizer.getnext(self)
+        self.report(cached, False)
+        return tok
+
+    def peek(self) -> tokenize.TokenInfo:
+        """Return the next token *without* updating the index."""
+        if self._index == self._length():
+            self._fetch()
+        return self._token(self._index)
+
+    def match_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if it has the given type."""
+        index = self._index
+        if index == self._length():
+            self._fetch()
+        if self._types[index - self._offset] == type:
+            self._index = index + 1
+            return self._token(index)
+        return None
+
+    def match_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if its string is string."""
+        index = self._index
+        if index == self._length():
+            self._fetch()
+        if self._strings[index - self._offset] == string:
+            self._index = index + 1
+            return self._token(index)
+        return None
+
+    def diagnose(self) -> tokenize.TokenInfo:
+        if not self._length():
+            self._fetch()
+        return self._token(self._length() - 1)
+
+    def reset(self, index: Mark) -> None:
+        assert 0 <= index <= self._length(), (index, self._length())
+        self._index = index
+
+    def _verbose_reset(self, index: Mark) -> None:
+        if index == self._index:
+            return
+        assert 0 <= index <= self._length(), (index, self._length())
+        old_index = self._index
+        self._index = index
+        self.report(True, index < old_index)
+
+    def release(self, mark: Mark) -> None:
+        """Discard the tokens before mark; they must never be read again.
+
+        The token just before mark is kept, for diagnose() and report().
+        """
+        count = mark - 1 - self._offset
+        if count <= 0:
+            return
+        for column in (
+            self._types,
+            self._strings,
+            self._start_rows,
+            self._start_cols,
+            self._end_rows,
+            self._end_cols,
+            self._line_ids,
+        ):
+            del column[:count]
+        self._offset += count
+        first_line = self._line_ids[0] if self._line_ids else self._line_offset + len(self._lines)
+        del self._lines[: first_line - self._line_offset]
+        self._line_offset = first_line
+        self._floor = max(self._floor, mark)
+
+    def rebase(self, mark: Mark) -> None:
+        """Discard the tokens before mark and renumber the others from 0.
+
+        The token just before mark is kept, for diagnose() and report(),
+        and becomes token 0.  Marks taken before must not be used again.
+        """
+        self.release(mark)
+        count = self._offset
+        self._offset = 0
+        self._index -= count
+        self._floor = max(self._floor - count, 0)
+        self._last_index -= count
+
+    def report(self, cached: bool, back: bool) -> None:
+        if back:
+            fill = "-" * self._index + "-"
+        elif cached:
+            fill = "-" * self._index + ">"
+        else:
+            fill = "-" * self._index + "*"
+        if self._index == 0:
+            print(f"{fill} (Bof)")
+        else:
+            tok = self._token(self._index - 1)
+            print(f"{fill} {shorttok(tok)}")
+
+
+class TokenEdit(NamedTuple):
+    """How IncrementalTokenizer.edit() changed the tokens.
+
+    The tokens from start to old_end were replaced by the tokens from
+    start to new_end.  If resynced is true, the tokens after them are the
+    old ones, moved by row_delta rows; otherwise all the tokens from start
+    on are new, and the ones after new_end have not been fetched yet.
+    """
+
+    start: Mark
+    old_end: Mark
+    new_end: Mark
+    row_delta: int
+    resynced: bool
+
+
+def _raise(error: Exception) -> Iterator[tokenize.TokenInfo]:
+    raise error
+    yield  # Makes this a generator
+
+
+class IncrementalTokenizer(Tokenizer):
+    """Tokenizer for a source string that can be edited.
+
+    edit() re-tokenizes the source from the last statement at indentation
+    0 starting before the edit, up to the first such statement after it
+    (if the tokens there are unchanged), and keeps the other tokens.
+    The tokenizer also tracks how far the parser has looked ahead, so
+    that Parser.edit() can tell which memo entries an edit invalidates.
+
+    When an edit adds or removes lines, the tokens after it are not
+    rewritten at once: their row shifts are recorded as ranges of token
+    indexes, and applied to each token when it is read.
+    """
+
+    # Rewrite all the tokens when the row shifts get this fragmented.
+    max_stale_ranges = 256
+
+    def __init__(self, source: str, *, verbose: bool = False):
+        self.source = source
+        # One past the last token read since the last edit.
+        self._examined = 0
+        # Sorted (start, end, rows) ranges of tokens to move down by rows
+        # rows, and the start of the first one.
+        self._stale: List[Tuple[Mark, Mark, int]] = []
+        self._stale_from = sys.maxsize
+        super().__init__(generate_source_tokens(source), verbose=verbose)
+
+    def getnext(self) -> tokenize.TokenInfo:
+        """Return the next token and updates the index."""
+        if self._index >= self._stale_from:
+            self._refresh(self._index)
+        tok = Tokenizer.getnext(self)
+        if self._index > self._examined:
+            self._examined = self._index
+        return tok
+
+    def _verbose_getnext(self) -> tokenize.TokenInfo:
+        if self._index >= self._stale_from:
+            self._refresh(self._index)
+        tok = Tokenizer._verbose_getnext(self)
+        if self._index > self._examined:
+            self._examined = self._index
+        return tok
+
+    def peek(self) -> tokenize.TokenInfo:
+        """Return the next token *without* updating the index."""
+        if self._index >= self._stale_from:
+            self._refresh(self._index)
+        tok = Tokenizer.peek(self)
+        if self._index >= self._examined:
+            self._examined = self._index + 1
+        return tok
+
+    def match_type(self, type: int) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if it has the given type."""
+        index = self._index
+        if index >= self._stale_from:
+            self._refresh(index)
+        tok = Tokenizer.match_type(self, type)
+        if index >= self._examined:
+            self._examined = index + 1
+        return tok
+
+    def match_string(self, string: str) -> Optional[tokenize.TokenInfo]:
+        """Return the next token and update the index if its string is string."""
+        index = self._index
+        if index >= self._stale_from:
+            self._refresh(index)
+        tok = Tokenizer.match_string(self, string)
+        if index >= self._examined:
+            self._examined = index + 1
+        return tok
+
+    def diagnose(self) -> tokenize.TokenInfo:
+        if self._tokens:
+            self._refresh(len(self._tokens) - 1)
+        return Tokenizer.diagnose(self)
+
+    def report(self, cached: bool, back: bool) -> None:
+        if self._index:
+            self._refresh(self._index - 1)
+        Tokenizer.report(self, cached, back)
+
+    def _find_stale(self, index: Mark) -> int:
+        """Return the position in _stale of the range holding index, or -1."""
+        stale = self._stale
+        i = bisect.bisect_right(stale, (index, sys.maxsize)) - 1
+        if i >= 0 and index < stale[i][1]:
+            return i
+        return -1
+
+    def _start(self, index: Mark) -> Tuple[int, int]:
+        """Return the start of the token at index, without moving it."""
+        i = self._find_stale(index)
+        row, col = self._tokens[index].start
+        return (row + self._stale[i][2] if i >= 0 else row), col
+
+    def _refresh(self, index: Mark) -> None:
+        """Apply the pending row shift of the token at index, if any."""
+        i = self._find_stale(index)
+        if i < 0:
+            return
+        stale = self._stale
+        start, end, rows = stale[i]
+        self._tokens[index] = shift_token(self._tokens[index], rows)
+        stale[i : i + 1] = [
+            (low, high, rows) for low, high in ((start, index), (index + 1, end)) if low < high
+        ]
+        self._stale_from = stale[0][0] if stale else sys.maxsize
+
+    def _move_stale(self, change: TokenEdit) -> None:
+        """Update the row shift ranges for an edit of the tokens."""
+        start, old_end, new_end, row_delta, resynced = change
+        shift = new_end - old_end
+        before: List[Tuple[Mark, Mark, int]] = []
+        after: List[Tuple[Mark, Mark, int]] = []
+        for low, high, rows in self._stale:
+            if low < start:
+                before.append((low, min(high, start), rows))
+            if high > old_end and resynced:
+                after.append((max(low, old_end) + shift, high + shift, rows + row_delta))
+        if resynced and row_delta:
+            # Fill the gaps: the tokens there were up to date.
+            filled = []
+            index = new_end
+            for low, high, rows in after:
+                if index < low:
+                    filled.append((index, low, row_delta))
+                filled.append((low, high, rows))
+                index = high
+            if index < len(self._tokens):
+                filled.append((index, len(self._tokens), row_delta))
+            after = filled
+        stale = before + [item for item in after if item[2]]
+        if len(stale) > self.max_stale_ranges:
+            tokens = self._tokens
+            for low, high, rows in stale:
+                for index in range(low, high):
+                    tokens[index] = shift_token(tokens[index], rows)
+            stale = []
+        self._stale = stale
+        self._stale_from = stale[0][0] if stale else sys.maxsize
+
+    def restart(self, tokengen: Iterator[tokenize.TokenInfo]) -> None:
+        raise TypeError("An IncrementalTokenizer cannot restart; edit() its whole source instead")
+
+    def release(self, mark: Mark) -> None:
+        """Do nothing: the tokens are kept for the next edit."""
+
+    def rebase(self, mark: Mark) -> None:
+        """Do nothing: the tokens are kept for the next edit."""
+
+    def edit(self, offset: int, removed: int, inserted: str) -> TokenEdit:
+        """Replace removed characters at offset in the source by inserted.
+
+        The index is reset to 0.
+        """
+        source = self.source
+        end = offset + removed
+        if not 0 <= offset <= end <= len(source):
+            raise ValueError(f"Edit {offset}:{end} out of range for {len(source)} characters")
+        complete = self._fetch_all()
+        tokens = self._tokens
+        self.source = new_source = source[:offset] + inserted + source[end:]
+
+        # Find the last statement at indentation 0 starting on or before
+        # the edited line: the tokenizer state there is known.
+        row = source.count("\n", 0, offset) + 1
+        low, high = 0, len(tokens)
+        while low < high:
+            middle = (low + high) // 2
+            if self._start(middle)[0] <= row:
+                low = middle + 1
+            else:
+                high = middle
+        start = max(low - 1, 0)
+        while start > 0 and not self._starts_statement(start):
+            start -= 1
+        restart_row = self._start(start)[0] if start else 1
+        line_start = source.rfind("\n", 0, offset) + 1
+        for _ in range(row - restart_row):
+            line_start = source.rfind("\n", 0, line_start - 1) + 1
+        tokengen = generate_source_tokens(new_source, line_start, restart_row)
+
+        # Tokenize until a statement at indentation 0 after the edit that
+        # also starts a statement in the old tokens: from there on, the
+        # tokens are the same but for their rows.
+        new_tokens: List[tokenize.TokenInfo] = []
+        old_end = len(tokens)
+        row_delta = inserted.count("\n") - source.count("\n", offset, end)
+        resynced = False
+        if complete:
+            end_row = row + inserted.count("\n")
+            previous = tokens[start - 1].type if start else token.NEWLINE
+            index = start
+            try:
+                for tok in tokengen:
+                    if (
+                        tok.start[0] > end_row
+                        and tok.start[1] == 0
+                        and tok.type not in (token.INDENT, token.DEDENT)
+                        and previous == token.NEWLINE
+                    ):
+                        old_start = (tok.start[0] - row_delta, 0)
+                        while index < old_end and self._start(index) < old_start:
+                            index += 1
+                        if (
+                            index < old_end
+                            and self._start(index) == old_start
+                            and self._starts_statement(index)
+                        ):
+                            old_end = index
+                            resynced = True
+                            break
+                    new_tokens.append(tok)
+                    previous = tok.type
+            except (SyntaxError, tokenize.TokenError) as error:
+                # Fail when the parser gets there, as Tokenizer would.
+                tokengen = _raise(error)
+
+        tokens[start:old_end] = new_tokens
+        change = TokenEdit(start, old_end, start + len(new_tokens), row_delta, resynced)
+        self._move_stale(change)
+        if not resynced:
+            self._tokengen = tokengen
+        self._index = self._examined = 0
+        return change
+
+    def _starts_statement(self, index: Mark) -> bool:
+        """Return whether the token at index starts a statement at indentation 0."""
+        tokens = self._tokens
+        tok = tokens[index]
+        return (
+            tok.start[1] == 0
+            and tok.type not in (token.INDENT, token.DEDENT)
+            and (index == 0 or tokens[index - 1].type == token.NEWLINE)
+        )
+
+    def _fetch_all(self) -> bool:
+        """Fetch the remaining tokens; return whether the source tokenizes."""
+        index = self._index
+        try:
+            while not self._tokens or self._tokens[-1].type != token.ENDMARKER:
+                self._index = len(self._tokens)
+                Tokenizer.peek(self)
+        except (SyntaxError, tokenize.TokenError, StopIteration):
+            return False
+        finally:
+            self._index = index
+        return True
@@ -0,0 +1,145 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, AsyncIterator, List
+
+import pytest  # type: ignore
+
+from pegen.async_tokenizer import AsyncTokenizer, parse_async, stream_async
+from pegen.tokenizer import Tokenizer, generate_source_tokens
+
+from .utils import make_parser
+
+GRAMMAR = """
+start: stmt* ENDMARKER
+stmt: NAME '=' sum NEWLINE { (name.string, sum) } | if_stmt
+if_stmt: 'if' NAME ':' NEWLINE INDENT stmt+ DEDENT 'else' ':' NEWLINE INDENT stmt+ DEDENT
+sum: sum '+' term { (sum, term) } | term
+term: '(' sum ')' { sum } | NUMBER { number.string } | NAME { name.string } | STRING
+"""
+
+SOURCE = """\
+# -*- coding: latin-1 -*-
+a = 1 + b
+c = (2 +
+     3)
+if x:
+    d = 4
+else:
+    e = 'é'
+f = 5"""
+
+
+async def chunks(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[start : start + size]
+
+
+def expected_trees(source: str) -> List[Any]:
+    parser_class = make_parser(GRAMMAR)
+    parser = parser_class(Tokenizer(generate_source_tokens(source)))
+    return list(parser.stream("stmt"))
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_stream_async(size: int) -> None:
+    parser_class = make_parser(GRAMMAR)
+
+    async def parse() -> List[Any]:
+        parser = parser_class(AsyncTokenizer(chunks(SOURCE.encode("latin-1"), size)))
+        return [tree async for tree in stream_async(parser, "stmt")]
+
+    assert asyncio.run(parse()) == expected_trees(SOURCE)
+
+
+def test_stream_reader() -> None:
+    parser_class = make_parser(GRAMMAR)
+    source = "".join(f"x{i} = {i} + y\n" for i in range(200))
+
+    async def parse() -> List[Any]:
+        reader = asyncio.StreamReader()
+        parser = parser_class(AsyncTokenizer(reader, yield_every=10))
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        reader.feed_data(source.encode())
+        reader.feed_eof()
+        trees = [tree async for tree in stream_async(parser, "stmt")]
+        ticker.cancel()
+        # The event loop ran between the items.
+        assert ticks >= 100
+        return trees
+
+    assert asyncio.run(parse()) == expected_trees(source)
+
+
+def test_stream_async_syntax_error() -> None:
+    parser_class = make_parser(GRAMMAR)
+
+    async def parse() -> None:
+        parser = parser_class(AsyncTokenizer(chunks(b"a = 1\nb = +\n", 2)))
+        async for _ in stream_async(parser, "stmt", "input.txt"):
+            pass
+
+    with pytest.raises(SyntaxError) as error:
+        asyncio.run(parse())
+    assert error.value.args[1][0] == "input.txt"
+
+
+def test_stream_async_nullable_rule() -> None:
+    parser_class = make_parser("start: stmt* ENDMARKER\nstmt: NAME? NEWLINE? { 'stmt' }\n")
+
+    async def parse() -> List[Any]:
+        parser = parser_class(AsyncTokenizer(chunks(b"a\nb\n42\n", 2)))
+        trees = []
+        async for tree in stream_async(parser, "stmt", "input.txt"):
+            trees.append(tree)
+            assert len(trees) <= 2
+        return trees
+
+    with pytest.raises(SyntaxError) as error:
+        asyncio.run(parse())
+    assert error.value.args[1][0] == "input.txt"
+
+
+def test_parse_async() -> None:
+    parser_class = make_parser(GRAMMAR)
+    data = b"\xef\xbb\xbfa = 1\n"
+
+    async def parse() -> Any:
+        return await parse_async(parser_class(AsyncTokenizer(chunks(data, 2))))
+
+    parser = parser_class(Tokenizer(generate_source_tokens("a = 1\n")))
+    assert asyncio.run(parse()) == parser.start()
+
+
+@pytest.mark.parametrize("terms", [10, 200])
+def test_parse_in_executor(terms: int) -> None:
+    parser_class = make_parser(GRAMMAR)
+    source = f"a = {' + '.join(['(b)'] * terms)}\nc = 1\n"
+    threads = set()
+
+    class Executor(concurrent.futures.ThreadPoolExecutor):
+        def submit(self, fn: Any, *args: Any, **kwargs: Any) -> Any:
+            def call() -> Any:
+                threads.add(threading.get_ident())
+                return fn(*args, **kwargs)
+
+            return super().submit(call)
+
+    async def parse() -> List[Any]:
+        with Executor(1) as executor:
+            parser = parser_class(AsyncTokenizer(chunks(source.encode(), 100), yield_every=50))
+            return [tree async for tree in stream_async(parser, "stmt", executor=executor)]
+
+    assert asyncio.run(parse()) == expected_trees(source)
+    # Only the long statement is parsed in the executor.
+    assert len(threads) == (terms > 10)
+    assert threading.get_ident() not in threads
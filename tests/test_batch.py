@@ -0,0 +1,93 @@
+import sys
+from typing import Any, List
+
+import pytest  # type: ignore
+
+from pegen.__main__ import main
+from pegen.batch import find_files, parse_files
+from pegen.build import build_parser, build_python_generator
+
+GRAMMAR = """
+start: stmts=stmt* ENDMARKER { stmts }
+stmt: NAME '=' NUMBER NEWLINE { (name.string, number.string) }
+"""
+
+
+@pytest.fixture
+def corpus(tmp_path: Any) -> List[str]:
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    files = []
+    for i in range(20):
+        path = tmp_path / "src" / ("sub" if i % 2 else "") / f"f{i:02}.py"
+        path.write_text(f"x = {i}\n" if i != 7 else "x = = 7\n")
+        files.append(str(path))
+    (tmp_path / "src" / "notes.txt").write_text("not python\n")
+    return files
+
+
+@pytest.fixture
+def grammar_file(tmp_path: Any) -> str:
+    path = tmp_path / "simple.gram"
+    path.write_text(GRAMMAR)
+    return str(path)
+
+
+@pytest.fixture
+def parser_module(tmp_path: Any, grammar_file: str) -> str:
+    module_path = str(tmp_path / "simple_parser.py")
+    grammar, _, _ = build_parser(grammar_file)
+    build_python_generator(grammar, grammar_file, module_path)
+    return module_path
+
+
+def test_find_files(tmp_path: Any, corpus: List[str]) -> None:
+    src = str(tmp_path / "src")
+    assert sorted(find_files([src])) == sorted(corpus)
+    assert find_files([src], exclude=["*/sub/*"]) == [file for file in corpus if "sub" not in file]
+    assert find_files([corpus[3], corpus[0]]) == [corpus[3], corpus[0]]
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_parse_files(parser_module: str, corpus: List[str], jobs: int) -> None:
+    results = list(parse_files(parser_module, corpus, jobs=jobs, chunksize=2, trees=True))
+    assert [result.filename for result in results] == corpus
+    for i, result in enumerate(results):
+        if i == 7:
+            assert result.tree is None
+            assert isinstance(result.error, SyntaxError)
+            assert result.error.filename == corpus[7]
+        else:
+            assert result.error is None
+            assert result.tree == [("x", str(i))]
+
+
+def test_parse_files_without_trees(parser_module: str, corpus: List[str]) -> None:
+    results = list(parse_files(parser_module, corpus + ["missing.py"], jobs=2))
+    assert all(result.tree is None for result in results)
+    assert isinstance(results[-1].error, FileNotFoundError)
+
+
+def test_parse_command(
+    tmp_path: Any, grammar_file: str, corpus: List[str], capsys: Any, monkeypatch: Any
+) -> None:
+    argv = ["pegen", "parse", "-j", "2", "-q", grammar_file, str(tmp_path / "src")]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 1
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [f"{corpus[7]}:1:5: pegen parse failure"]
+    assert "Parsed 20 files" in err
+
+
+@pytest.mark.parametrize("command", [[], ["generate"]])
+def test_generate_command(
+    tmp_path: Any, grammar_file: str, command: List[str], monkeypatch: Any
+) -> None:
+    output = tmp_path / "parse.py"
+    argv = ["pegen", *command, "-q", grammar_file, "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 0
+    assert "class GeneratedParser(Parser):" in output.read_text()
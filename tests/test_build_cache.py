@@ -0,0 +1,40 @@
+import os
+from typing import Any
+
+from pegen.build_cache import BuildCache, make_parser_class
+
+from .utils import parse_string
+
+GRAMMAR = """
+start: sum NEWLINE ENDMARKER { sum }
+sum: sum '+' term { (sum, term) } | term
+term: NUMBER { number.string }
+"""
+
+
+def test_build_cache(tmp_path: Any) -> None:
+    grammar_file = tmp_path / "sum.gram"
+    grammar_file.write_text(GRAMMAR)
+    cache = BuildCache(str(tmp_path / "cache"))
+    path = cache.build(str(grammar_file))
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert os.listdir(tmp_path / "cache" / "__pycache__")
+    parser_class = cache.load_parser_class(str(grammar_file))
+    assert parse_string("1 + 2\n", parser_class) == (["1"], "2")
+
+    # Another process sharing the directory.
+    cache = BuildCache(str(tmp_path / "cache"))
+    assert cache.build(str(grammar_file)) == path
+    assert cache.build(str(grammar_file), prune=True) != path
+    assert cache.report() == "1 hits, 1 misses (50% hit rate)"
+
+    grammar_file.write_text(GRAMMAR.replace("'+'", "'-'"))
+    assert cache.build(str(grammar_file)) != path
+    assert len(os.listdir(tmp_path / "cache")) == 4  # Three modules and __pycache__
+
+
+def test_make_parser_class() -> None:
+    parser_class = make_parser_class(GRAMMAR)
+    assert make_parser_class(GRAMMAR) is parser_class
+    assert make_parser_class(GRAMMAR, inline_memo=True) is not parser_class
+    assert parse_string("1 + 2\n", parser_class) == (["1"], "2")
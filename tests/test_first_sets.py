@@ -1,6 +1,6 @@
-from typing import Set, Dict
+from typing import Dict, Optional, Set
 
-from pegen.first_sets import FirstSetCalculator
+from pegen.first_sets import FirstSetCalculator, GuardSetCalculator
 from pegen.grammar import Grammar
 from pegen.grammar_parser import GeneratedParser as GrammarParser
 
@@ -12,6 +12,12 @@ def calculate_first_sets(grammar_source: str) -> Dict[str, Set[str]]:
     return FirstSetCalculator(grammar.rules).calculate()
 
 
+def calculate_guard_sets(grammar_source: str) -> Dict[str, Optional[Set[str]]]:
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    calculator = GuardSetCalculator(grammar.rules, {"NAME", "NUMBER", "ENDMARKER"})
+    return {name: calculator.guard(rule.rhs) for name, rule in grammar.rules.items()}
+
+
 def test_alternatives() -> None:
     grammar = """
         start: expr NEWLINE? ENDMARKER
@@ -239,3 +245,22 @@ def test_multiple_nullable_rules() -> None:
         "other": {"'*'"},
         "another": {"'/'"},
     }
+
+
+def test_guard_sets() -> None:
+    grammar = """
+    start: target '=' | !'-' thing $
+    target: maybe '+' | NAME
+    maybe: maybe '-' | target
+    thing: ['-'] NUMBER
+    forced: &&'x' NAME
+    sign: ['-']
+    """
+    assert calculate_guard_sets(grammar) == {
+        "start": {"NAME", "NUMBER", "'-'"},
+        "target": {"NAME"},
+        "maybe": {"NAME"},
+        "thing": {"NUMBER", "'-'"},
+        "forced": None,
+        "sign": None,
+    }
@@ -0,0 +1,153 @@
+import textwrap
+
+import pytest  # type: ignore
+
+from pegen.build_cache import make_parser_class
+from pegen.grammar import Grammar
+from pegen.grammar_parser import GeneratedParser as GrammarParser
+from pegen.optimizer import optimize_grammar
+
+from tests.utils import parse_string
+
+
+def optimize(grammar_source: str, **kwargs: object) -> str:
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    return str(optimize_grammar(grammar, **kwargs))  # type: ignore
+
+
+def test_splice_and_eliminate() -> None:
+    grammar = """
+    start: stmt* $
+    stmt: expr NEWLINE
+    expr: expr '+' term | term { term }
+    term: '(' expr ')' { expr } | atom { atom }
+    atom: a=NAME { a } | NUMBER
+    unused: NAME
+    """
+    expected = """
+    start: stmt* $
+    stmt: expr NEWLINE
+    expr: expr '+' term | term
+    term: '(' expr ')' | NAME | NUMBER
+    """
+    assert optimize(grammar) == textwrap.dedent(expected).strip()
+
+
+def test_splice_single_alternative() -> None:
+    grammar = """
+    start: value+ NEWLINE $
+    value: p=pair { p } | NUMBER
+    pair: NAME '=' NAME
+    """
+    expected = """
+    start: value+ NEWLINE $
+    value: NAME '=' NAME | NUMBER
+    """
+    assert optimize(grammar) == textwrap.dedent(expected).strip()
+    parser_class = make_parser_class(textwrap.dedent(grammar), optimize=True)
+    result = parse_string("a = b 1\n", parser_class)
+    assert [tok.string for tok in result[0][0]] == ["a", "=", "b"]
+
+
+def test_aliases() -> None:
+    grammar = """
+    start: target eq value+ sign? $
+    target: t=name { t }
+    name: n=NAME { n }
+    eq: e='=' { e }
+    value: NUMBER | STRING
+    sign: s=('+' | '-') { s }
+    """
+    expected = """
+    start: NAME '=' value+ sign? $
+    value: NUMBER | STRING
+    sign: '+' | '-'
+    """
+    assert optimize(grammar) == textwrap.dedent(expected).strip()
+
+
+def test_kept_rules() -> None:
+    grammar = """
+    start: a b c d $
+    a: x=NAME { x }
+    b (memo): x=NAME { x }
+    c: d ~ NAME | d
+    d: NUMBER
+    """
+    expected = """
+    start: NAME b c d $
+    b: NAME
+    c: d ~ NAME | d
+    d: NUMBER
+    """
+    assert optimize(grammar) == textwrap.dedent(expected).strip()
+    assert optimize(grammar, keep={"a"}).startswith("start: a b c d $")
+    # Without a start rule, every rule is kept.
+    assert "c: d ~ NAME | d\nd: NUMBER\nextra: NUMBER" in optimize(
+        grammar.replace("start", "begin") + "extra: NUMBER\n"
+    )
+
+
+def test_no_splicing_with_cuts() -> None:
+    grammar = """
+    start: s $
+    s: x=('(' ~ NAME ')' | NAME) { x } | y { y }
+    y: '[' ~ NAME ']' | NUMBER
+    """
+    assert optimize(grammar).splitlines()[1:] == [
+        "s: ('(' ~ NAME ')' | NAME) | y",
+        "y: '[' ~ NAME ']' | NUMBER",
+    ]
+
+
+def test_no_splicing_false_results() -> None:
+    grammar = """
+    start: a NEWLINE $ { a }
+    a: b { b } | NAME { 'fallback' }
+    b: NAME { None } | NUMBER { number.string }
+    """
+    assert optimize(grammar).splitlines()[1:3] == ["a: b | NAME", "b: NAME | NUMBER"]
+    for optimized in (False, True):
+        parser_class = make_parser_class(textwrap.dedent(grammar), optimize=optimized)
+        assert parse_string("x\n", parser_class) == "fallback"
+        assert parse_string("1\n", parser_class) == "1"
+    grammar = """
+    @default_result single
+    start: a NEWLINE $ { a }
+    a: b { b } | NAME NAME? { 'fallback' }
+    b: NAME? | NUMBER '+' | '-' &NAME
+    """
+    assert optimize(grammar).splitlines()[1:3] == [
+        "a: b | NAME NAME?",
+        "b: NAME? | NUMBER '+' | '-' &NAME",
+    ]
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["1 + (a - 2)\n", "f(x, y) + -3\n", "[a, b] + 1 - []\n", "1 + )\n", "- -\n"],
+)
+def test_optimized_parser(source: str) -> None:
+    grammar = """
+    start: stmts=stmt* $ { stmts }
+    stmt: e=expr NEWLINE { e }
+    expr: expr op=('+' | '-') term { (expr, op[0].string, term) } | term { term }
+    term: '-' term { ('neg', term) } | primary { primary }
+    primary: call { call } | atom { atom }
+    call: f=ident '(' args=','.expr+ ')' { ('call', f, args) }
+    atom: n=ident { n } | NUMBER { int(number.string) } | seq { seq } | '(' e=expr ')' { e }
+    seq: '[' items=','.expr+ ']' { ('list', items) } | '[' ']' { ('list', []) }
+    ident: n=NAME { n.string }
+    """
+    parser_class = make_parser_class(textwrap.dedent(grammar))
+    optimized_class = make_parser_class(textwrap.dedent(grammar), optimize=True)
+    # atom is kept, as its result may be 0.
+    assert not hasattr(optimized_class, "primary") and hasattr(optimized_class, "atom")
+    try:
+        expected = parse_string(source, parser_class)
+    except SyntaxError as error:
+        with pytest.raises(SyntaxError) as optimized_error:
+            parse_string(source, optimized_class)
+        assert optimized_error.value.args == error.args
+    else:
+        assert parse_string(source, optimized_class) == expected
@@ -1,14 +1,28 @@
+import ast
+import functools
 import io
+import itertools
+import sys
 import textwrap
-from tokenize import NAME, NEWLINE, NUMBER, OP, TokenInfo
+import tokenize
+import tracemalloc
+from tokenize import ENDMARKER, NAME, NEWLINE, NUMBER, OP, TokenInfo
 from typing import Any, Dict, Type
 
 import pytest  # type: ignore
 
 from pegen.grammar import Grammar, GrammarError
+from pegen.build_cache import make_parser_class
 from pegen.grammar_parser import GeneratedParser as GrammarParser
-from pegen.parser import Parser
+from pegen.parser import FIRST_RULE_ID, MemoStats, Parser, read_memo_plan, simple_parser_main
 from pegen.python_generator import PythonParserGenerator
+from pegen.tokenizer import (
+    CompactTokenizer,
+    IncrementalTokenizer,
+    Tokenizer,
+    generate_line_tokens,
+    generate_source_tokens,
+)
 
 from .utils import generate_parser, make_parser, parse_string
 
@@ -207,8 +221,8 @@ def test_repeat_0_simple() -> None:
     assert node == [
         [TokenInfo(NUMBER, string="1", start=(1, 0), end=(1, 1), line="1 2 3\n")],
         [
-            [[TokenInfo(NUMBER, string="2", start=(1, 2), end=(1, 3), line="1 2 3\n")]],
-            [[TokenInfo(NUMBER, string="3", start=(1, 4), end=(1, 5), line="1 2 3\n")]],
+            [TokenInfo(NUMBER, string="2", start=(1, 2), end=(1, 3), line="1 2 3\n")],
+            [TokenInfo(NUMBER, string="3", start=(1, 4), end=(1, 5), line="1 2 3\n")],
         ],
         TokenInfo(NEWLINE, string="\n", start=(1, 5), end=(1, 6), line="1 2 3\n"),
     ]
@@ -231,16 +245,12 @@ def test_repeat_0_complex() -> None:
         [TokenInfo(NUMBER, string="1", start=(1, 0), end=(1, 1), line="1 + 2 + 3\n")],
         [
             [
-                [
-                    TokenInfo(OP, string="+", start=(1, 2), end=(1, 3), line="1 + 2 + 3\n"),
-                    [TokenInfo(NUMBER, string="2", start=(1, 4), end=(1, 5), line="1 + 2 + 3\n")],
-                ]
+                TokenInfo(OP, string="+", start=(1, 2), end=(1, 3), line="1 + 2 + 3\n"),
+                [TokenInfo(NUMBER, string="2", start=(1, 4), end=(1, 5), line="1 + 2 + 3\n")],
             ],
             [
-                [
-                    TokenInfo(OP, string="+", start=(1, 6), end=(1, 7), line="1 + 2 + 3\n"),
-                    [TokenInfo(NUMBER, string="3", start=(1, 8), end=(1, 9), line="1 + 2 + 3\n")],
-                ]
+                TokenInfo(OP, string="+", start=(1, 6), end=(1, 7), line="1 + 2 + 3\n"),
+                [TokenInfo(NUMBER, string="3", start=(1, 8), end=(1, 9), line="1 + 2 + 3\n")],
             ],
         ],
         TokenInfo(NEWLINE, string="\n", start=(1, 9), end=(1, 10), line="1 + 2 + 3\n"),
@@ -257,8 +267,8 @@ def test_repeat_1_simple() -> None:
     assert node == [
         [TokenInfo(NUMBER, string="1", start=(1, 0), end=(1, 1), line="1 2 3\n")],
         [
-            [[TokenInfo(NUMBER, string="2", start=(1, 2), end=(1, 3), line="1 2 3\n")]],
-            [[TokenInfo(NUMBER, string="3", start=(1, 4), end=(1, 5), line="1 2 3\n")]],
+            [TokenInfo(NUMBER, string="2", start=(1, 2), end=(1, 3), line="1 2 3\n")],
+            [TokenInfo(NUMBER, string="3", start=(1, 4), end=(1, 5), line="1 2 3\n")],
         ],
         TokenInfo(NEWLINE, string="\n", start=(1, 5), end=(1, 6), line="1 2 3\n"),
     ]
@@ -277,16 +287,12 @@ def test_repeat_1_complex() -> None:
         [TokenInfo(NUMBER, string="1", start=(1, 0), end=(1, 1), line="1 + 2 + 3\n")],
         [
             [
-                [
-                    TokenInfo(OP, string="+", start=(1, 2), end=(1, 3), line="1 + 2 + 3\n"),
-                    [TokenInfo(NUMBER, string="2", start=(1, 4), end=(1, 5), line="1 + 2 + 3\n")],
-                ]
+                TokenInfo(OP, string="+", start=(1, 2), end=(1, 3), line="1 + 2 + 3\n"),
+                [TokenInfo(NUMBER, string="2", start=(1, 4), end=(1, 5), line="1 + 2 + 3\n")],
             ],
             [
-                [
-                    TokenInfo(OP, string="+", start=(1, 6), end=(1, 7), line="1 + 2 + 3\n"),
-                    [TokenInfo(NUMBER, string="3", start=(1, 8), end=(1, 9), line="1 + 2 + 3\n")],
-                ]
+                TokenInfo(OP, string="+", start=(1, 6), end=(1, 7), line="1 + 2 + 3\n"),
+                [TokenInfo(NUMBER, string="3", start=(1, 8), end=(1, 9), line="1 + 2 + 3\n")],
             ],
         ],
         TokenInfo(NEWLINE, string="\n", start=(1, 9), end=(1, 10), line="1 + 2 + 3\n"),
@@ -312,6 +318,40 @@ def test_repeat_with_sep_simple() -> None:
     ]
 
 
+def test_unused_repeats() -> None:
+    grammar_source = """
+    start: a=args ','? NEWLINE* &(NAME+) b=[','.NAME+] c=[NUMBER+] ';'* NEWLINE $ { (a, b, c) }
+    args: '(' ','.NUMBER+ [','] ')' { 'args' } | NUMBER+ { 'number' }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    genr.generate("<string>")
+    # Only b and c are collected.
+    assert out.getvalue().count("children.append(elem)") == 1
+    assert out.getvalue().count("children.append(number)") == 1
+    assert out.getvalue().count("_count += 1") == 4
+    assert "self._tokenizer.peek().type == 1" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    a, b, c = parse_string("(1, 2,)\n\nx, y 3 4;;", parser_class)
+    assert a == "args"
+    assert [token.string for token in b] == ["x", "y"]
+    assert [token.string for token in c] == ["3", "4"]
+    a, b, c = parse_string("1 2 x", parser_class)
+    assert (a, b[0].string, c) == ("number", "x", [])
+    with pytest.raises(SyntaxError):
+        parse_string("1 2 3", parser_class)
+
+
+def test_unused_repeats_deduplicated_opt() -> None:
+    # The second optional repeat is bound to opt_1.
+    parser_class = make_parser("start: [NAME+] [NUMBER+] NEWLINE { opt_1 }")
+    result = parse_string("x 1 2\n", parser_class)
+    assert [token.string for token in result] == ["1", "2"]
+
+
 def test_left_recursive() -> None:
     grammar_source = """
     start: expr NEWLINE
@@ -493,24 +533,18 @@ def test_lookahead() -> None:
                     ],
                     [
                         [
+                            TokenInfo(
+                                OP, string="+", start=(1, 9), end=(1, 10), line="foo = 12 + 12 ."
+                            ),
                             [
                                 TokenInfo(
-                                    OP,
-                                    string="+",
-                                    start=(1, 9),
-                                    end=(1, 10),
+                                    NUMBER,
+                                    string="12",
+                                    start=(1, 11),
+                                    end=(1, 13),
                                     line="foo = 12 + 12 .",
-                                ),
-                                [
-                                    TokenInfo(
-                                        NUMBER,
-                                        string="12",
-                                        start=(1, 11),
-                                        end=(1, 13),
-                                        line="foo = 12 + 12 .",
-                                    )
-                                ],
-                            ]
+                                )
+                            ],
                         ]
                     ],
                 ],
@@ -519,6 +553,39 @@ def test_lookahead() -> None:
     ]
 
 
+@pytest.mark.parametrize("inline_memo", [False, True])
+def test_lookahead_specialization(inline_memo: bool) -> None:
+    grammar_source = """
+    start: stmt+ $
+    stmt:
+        | !'=' NAME &'(' call NEWLINE { 'call' }
+        | &t_lookahead !(NUMBER | STRING) expr &NEWLINE NEWLINE { 'expr' }
+        | !none NAME '=' &('[' | NUMBER) expr NEWLINE { 'assign' }
+    t_lookahead: '(' | '[' | NAME
+    call: '(' &(expr ')') expr ')' | '(' ')'
+    expr: NAME | NUMBER | '(' expr ')' | '[' expr ']'
+    none: NAME { None }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, inline_memo=inline_memo)
+    genr.generate("<string>")
+    # Single tokens are tested directly, other items without a helper.
+    assert "positive_lookahead" not in out.getvalue()
+    assert "negative_lookahead" not in out.getvalue()
+    assert "self._tokenizer.peek().string != '='" in out.getvalue()
+    assert "self._tokenizer.peek().type not in {2, 3}" in out.getvalue()
+    assert "_next.string in {'(', '['}" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    source = "f(x)\n[y]\nz = 1\nf()\n"
+    assert parse_string(source, parser_class)[0] == ["call", "expr", "assign", "call"]
+    for source in ["f(x]\n", "1\n", "z = a\n", "= x\n"]:
+        with pytest.raises(SyntaxError):
+            parse_string(source, parser_class)
+
+
 def test_named_lookahead_error() -> None:
     grammar = """
     start: foo=!'x' NAME
@@ -562,6 +629,529 @@ def test_cut() -> None:
     ]
 
 
+def test_memo_table_is_indexed_by_position() -> None:
+    grammar_source = """
+    start: sum NEWLINE
+    sum: term '+' term | term
+    term: NUMBER
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    genr.generate("<string>")
+    assert "@memoize(1000)" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class: Type[Parser] = ns["GeneratedParser"]
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1\n").readline))
+    parser = parser_class(tokenizer)
+    assert parser.start()
+    # The second alternative of sum reuses the term parsed at position 0.
+    term_id = parser_class.term.rule_id  # type: ignore
+    assert term_id >= FIRST_RULE_ID
+    assert parser._memo[0][term_id][1] == 1
+    assert parser.memo_size() == sum(len(slot) for slot in parser._memo)
+
+
+def test_memoize_flagged_only() -> None:
+    grammar_source = """
+    start: sum NEWLINE
+    sum: sum '+' term | term
+    term (memo): NUMBER
+    other: NAME
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, memoize_all=False)
+    genr.generate("<string>")
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class: Type[Parser] = ns["GeneratedParser"]
+    assert hasattr(parser_class.sum, "rule_id")  # Left-recursion leader
+    assert hasattr(parser_class.term, "rule_id")
+    assert not hasattr(parser_class.start, "rule_id")
+    assert not hasattr(parser_class.other, "rule_id")
+    node = parse_string("1 + 2\n", parser_class)
+    assert node == [
+        [
+            [[TokenInfo(NUMBER, string="1", start=(1, 0), end=(1, 1), line="1 + 2\n")]],
+            TokenInfo(OP, string="+", start=(1, 2), end=(1, 3), line="1 + 2\n"),
+            [TokenInfo(NUMBER, string="2", start=(1, 4), end=(1, 5), line="1 + 2\n")],
+        ],
+        TokenInfo(NEWLINE, string="\n", start=(1, 5), end=(1, 6), line="1 + 2\n"),
+    ]
+
+
+def test_memo_plan() -> None:
+    grammar_source = """
+    start: sum NEWLINE
+    sum: term '+' sum | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    stats = MemoStats()
+    for source in ["1 + 2\n", "3\n"]:
+        tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+        assert parser_class(tokenizer, memo_stats=stats).start()
+    # term is re-parsed by the second alternative of sum at the last number.
+    hits, misses, stores = stats.counts["term"]
+    assert hits == 2 and misses == 3 and stores == 3
+    assert stats.counts["start"] == [0, 2, 2]
+
+    plan = io.StringIO()
+    stats.write_plan(plan)
+    plan.seek(0)
+    assert read_memo_plan(plan) == {"term"}
+
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, memo_plan={"term"})
+    genr.generate("<string>")
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    assert hasattr(parser_class.term, "rule_id")
+    assert not hasattr(parser_class.sum, "rule_id")
+    assert parse_string("1 + 2\n", parser_class)
+
+
+def test_prune() -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: '(' ~ NUMBER ')' NEWLINE | NAME NEWLINE
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, prune=True)
+    genr.generate("<string>")
+    assert "(cut := self.cut(mark))" in out.getvalue()
+    assert "self.commit(mark)" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class: Type[Parser] = ns["GeneratedParser"]
+    source = "(1)\nfoo\n(2)\n"
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = parser_class(tokenizer)
+    node = parser.start()
+    assert len(node[0]) == 3
+    # Everything but the last statement's memo entries and tokens is gone.
+    assert parser.memo_size() < 10
+    assert [tok.type for tok in tokenizer._tokens] == [NEWLINE, ENDMARKER]
+    with pytest.raises(SyntaxError):
+        parse_string("(1)\n(foo)\n", parser_class)
+
+
+@pytest.mark.parametrize("tokenizer_class", [Tokenizer, CompactTokenizer])
+def test_prune_bounds_memory(tokenizer_class: Type[Tokenizer]) -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: NAME '=' NUMBER NEWLINE
+    """
+    parser_class = make_parser_class(
+        textwrap.dedent(grammar_source), prune=True, skip_actions=True
+    )
+
+    def peak(lines: int) -> int:
+        # The source itself is allocated before tracing starts.
+        readline = io.StringIO("x = 1\n" * lines).readline
+        tracemalloc.start()
+        try:
+            tokenizer = tokenizer_class(generate_line_tokens(readline))
+            assert parser_class(tokenizer).start()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    assert peak(10000) < 2 * peak(1000)
+
+
+def test_prune_needs_single_start_alternative() -> None:
+    grammar_source = """
+    start: NAME* NEWLINE | NUMBER* NEWLINE
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, prune=True)
+    genr.generate("<string>")
+    assert "self.commit(mark)" not in out.getvalue()
+
+
+def test_traced_methods_only_when_verbose(capsys: Any) -> None:
+    grammar_source = """
+    start: sum NEWLINE
+    sum: sum '+' term | term
+    term: NUMBER
+    """
+    parser_class = make_parser(grammar_source)
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 + 2\n").readline))
+    parser = parser_class(tokenizer)
+    assert "start" not in vars(parser)
+    assert parser.start()
+    assert capsys.readouterr().out == ""
+
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO("1 + 2\n").readline))
+    parser = parser_class(tokenizer, verbose=True)
+    for name in ("start", "sum", "term", "expect", "expect_string", "number"):
+        assert vars(parser)[name].__func__ is getattr(parser_class, name).traced
+    assert parser.start()
+    assert "Recursive sum" in capsys.readouterr().out
+
+
+def test_simple_parser_main_stats(tmp_path: Any, capsys: Any, monkeypatch: Any) -> None:
+    parser_class = make_parser("start: NUMBER ('+' NUMBER)* NEWLINE $")
+    path = tmp_path / "input.txt"
+    path.write_text("1 + 2 + 3\n")
+    monkeypatch.setattr(sys, "argv", ["parse.py", "-v", "-q", str(path)])
+    simple_parser_main(parser_class)
+    assert "; 1 lines (10 bytes)" in capsys.readouterr().out
+
+
+def test_inline_memo() -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: '(' ~ sum ')' NEWLINE | sum NEWLINE
+    sum: sum '+' term | term
+    term: NUMBER | NAME
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, inline_memo=True)
+    genr.generate("<string>")
+    assert "@memoize_inline(" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    inline_parser_class: Type[Parser] = ns["GeneratedParser"]
+    parser_class = generate_parser(grammar)
+    source = "(1 + a)\nb + 2\n"
+    expected = parse_string(source, parser_class)
+    assert parse_string(source, inline_parser_class) == expected
+    assert parse_string(source, inline_parser_class, verbose=True) == expected
+    with pytest.raises(SyntaxError):
+        parse_string("(1 +)\n", inline_parser_class)
+
+    tokenizer = Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline))
+    parser = inline_parser_class(tokenizer)
+    parser.start()
+    term_id = inline_parser_class.term.rule_id  # type: ignore
+    assert parser._memo[1][term_id][1] == 2
+
+
+def test_first_set_guards() -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: foo ';' NEWLINE | bar NEWLINE | 'pass' NEWLINE | !'x' [sum] NEWLINE
+    foo: bar '+' NUMBER | NAME
+    bar: foo '-' NUMBER | '(' ','.sum+ ')'
+    sum: sum '+' term | term
+    term: NUMBER | NAME | ['-'] '(' sum ')'
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, first_set_guards=True)
+    genr.generate("<string>")
+    assert "_tok.string == 'pass'" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    guarded_parser_class: Type[Parser] = ns["GeneratedParser"]
+    parser_class = generate_parser(grammar)
+    source = "a - 1 + 2;\n(1, b)\npass\n\n-(1 + a) + 2\n"
+    expected = parse_string(source, parser_class)
+    assert parse_string(source, guarded_parser_class) == expected
+    with pytest.raises(SyntaxError):
+        parse_string("x\n", guarded_parser_class)
+
+
+def test_first_set_guards_with_braces() -> None:
+    grammar_source = """
+    start: block* $
+    block: '{' NAME '}' NEWLINE | '{' '}' NEWLINE
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, first_set_guards=True)
+    genr.generate("<string>")
+    assert "_tok.string == '{'" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    assert parse_string("{a}\n{}\n", ns["GeneratedParser"])
+
+
+@pytest.mark.parametrize("options", [{}, {"inline_memo": True}, {"first_set_guards": True}])
+def test_left_factor(options: Dict[str, bool]) -> None:
+    grammar_source = """
+    start: stmt* $
+    stmt: NAME '=' NAME '(' ')' NEWLINE | NAME '=' expr NEWLINE | NAME ':' expr NEWLINE | expr NEWLINE
+    expr: term '+' expr | term '-' expr | term | '-' ~ term | '-' NAME
+    term: a=NUMBER b=NUMBER { (a.string, b.string) } | a=NUMBER { a.string } | NAME
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, left_factor=True, **options)
+    genr.generate("<string>")
+    # The alternatives of stmt share two items, then one.
+    assert "_pos2 = " in out.getvalue() and "_pos1 = " in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    factored_parser_class: Type[Parser] = ns["GeneratedParser"]
+    parser_class = generate_parser(grammar)
+    source = "a = f()\nb = 1 2 + 3\nc = d - -e\nf: 4\n-5\n"
+    expected = parse_string(source, parser_class)
+    assert parse_string(source, factored_parser_class) == expected
+    for source in ["a = f)\n", "- -x\n"]:
+        with pytest.raises(SyntaxError) as error:
+            parse_string(source, parser_class)
+        with pytest.raises(SyntaxError) as factored_error:
+            parse_string(source, factored_parser_class)
+        assert factored_error.value.args == error.value.args
+
+
+def test_default_result() -> None:
+    grammar_source = """
+    start: pair ','? NEWLINE $
+    pair: NAME '=' atom | atom
+    atom: NUMBER | '(' ~ atom ')'
+    """
+    results = {
+        "list": [[NAME, "=", [NUMBER]], [[NUMBER]]],
+        "tuple": [(NAME, "=", (NUMBER,)), ((NUMBER,),)],
+        "single": [(NAME, "=", NUMBER), NUMBER],
+    }
+
+    def types(tree: Any) -> Any:
+        if isinstance(tree, TokenInfo):
+            return tree.string if tree.type == OP else tree.type
+        return type(tree)(types(child) for child in tree)
+
+    for meta, expected in results.items():
+        source = f"@default_result {meta}\n{textwrap.dedent(grammar_source)}"
+        grammar: Grammar = parse_string(source, GrammarParser)
+        out = io.StringIO()
+        genr = PythonParserGenerator(grammar, out)
+        genr.generate("<string>")
+        # Cuts are only handled where there is one, and optional
+        # items are not wrapped in a tuple.
+        assert out.getvalue().count("cut = False") == 1
+        assert "(),)" not in out.getvalue()
+        ns: Dict[str, Any] = {}
+        exec(out.getvalue(), ns)
+        parser_class = ns["GeneratedParser"]
+        pairs = [parse_string(text, parser_class)[0] for text in ["a = 1\n", "2,\n"]]
+        assert [types(pair) for pair in pairs] == expected
+    source = f"@default_result set\n{textwrap.dedent(grammar_source)}"
+    grammar = parse_string(source, GrammarParser)
+    with pytest.raises(GrammarError):
+        PythonParserGenerator(grammar, io.StringIO())
+
+
+def test_skip_actions() -> None:
+    grammar_source = """
+    @subheader '''
+    #include "pegen.h"
+    '''
+    start[mod_ty]: a=stmt* $ { _PyAST_Module(a, p->arena) }
+    stmt[stmt_ty]: n=NAME '=' e=expr NEWLINE { _PyAST_Assign(n, e, EXTRA) } | e=expr NEWLINE { e }
+    expr[expr_ty]: a=expr '+' b=term { _PyAST_BinOp(a, Add, b, EXTRA) } | term
+    term[expr_ty]: '(' ~ e=expr ')' { e } | NAME | ','.NUMBER+ [','] { NULL }
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out, skip_actions=True)
+    genr.generate("<string>")
+    # The C actions, types and metas are dropped, and only cuts are assigned.
+    assert "_PyAST" not in out.getvalue() and "pegen.h" not in out.getvalue()
+    assert out.getvalue().count(":=") == 1
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class = ns["GeneratedParser"]
+    assert parse_string("x = (a + 1, 2,)\nb\n", parser_class) is True
+    assert parse_string("\n", parser_class) is True
+    with pytest.raises(SyntaxError):
+        parse_string("x = (a +)\n", parser_class)
+    with pytest.raises(SyntaxError):
+        parse_string("x = (1 2)\n", parser_class)
+
+
+def test_literals_compare_token_strings() -> None:
+    grammar_source = """
+    start: 'if' NAME ':' 'NEWLINE' $
+    """
+    grammar: Grammar = parse_string(grammar_source, GrammarParser)
+    out = io.StringIO()
+    genr = PythonParserGenerator(grammar, out)
+    genr.generate("<string>")
+    assert "self.expect_string('if')" in out.getvalue()
+    assert "self.expect_string(':')" in out.getvalue()
+    assert "self.expect('NEWLINE')" in out.getvalue()
+    ns: Dict[str, Any] = {}
+    exec(out.getvalue(), ns)
+    parser_class: Type[Parser] = ns["GeneratedParser"]
+    node = parse_string("if x:\n", parser_class)
+    assert node[0].string == "if"
+    assert node[3].type == NEWLINE
+    with pytest.raises(SyntaxError):
+        parse_string("iff x:\n", parser_class)
+
+
+def test_terminals_are_not_memoized() -> None:
+    grammar_source = """
+    start: NAME '=' sum NEWLINE
+    sum: sum '+' term | term
+    term: NUMBER | STRING
+    """
+    parser_class = make_parser(grammar_source)
+    for verbose in (False, True):
+        tokenizer = Tokenizer(
+            tokenize.generate_tokens(io.StringIO("x = 1 + '2'\n").readline), verbose=verbose
+        )
+        parser = parser_class(tokenizer, verbose=verbose)
+        assert parser.start()
+        keys = {key for slot in parser._memo for key in slot}
+        assert keys and not keys & {1, 2, 3, 4}
+
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_incremental_reparse(verbose: bool) -> None:
+    grammar_source = """
+    start: stmt* ENDMARKER
+    stmt: NAME '=' sum NEWLINE { (name.string, sum) }
+    sum: sum '+' term { (sum, term) } | term
+    term: '(' sum ')' { sum } | NUMBER { number.string } | NAME { name.string }
+    """
+    parser_class = make_parser(grammar_source)
+    source = "a = 1\nb = (2 +\n     3)\nc = a + b\n"
+    parser = parser_class(IncrementalTokenizer(source), verbose=verbose)
+    tree = parser.start()
+    for offset, removed, inserted in [
+        (4, 1, "42"),  # Same tokens
+        (4, 2, "4 + 5"),  # More tokens
+        (6, 0, "d = 6\n"),  # More lines
+        (35, 5, "(c)"),  # The last statement
+        (0, 12, ""),  # Remove whole statements
+        (3, 1, ""),  # Parse failure
+        (3, 0, "7"),
+    ]:
+        old_tree = tree
+        parser.edit(offset, removed, inserted)
+        tree = parser.start()
+        source = source[:offset] + inserted + source[offset + removed :]
+        assert parser._tokenizer.source == source
+        fresh = parser_class(Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline)))
+        assert tree == fresh.start()
+        if removed == 1 and inserted == "42":
+            # Memo entries after the edit were reused.
+            assert tree[0][2][0] is old_tree[0][2][0]
+
+
+@pytest.mark.parametrize(
+    "action",
+    [
+        "",
+        "{ ast.Name(id=name.string, ctx=ast.Load(), lineno=name.start[0], col_offset=0) }",
+        "{ {'row': name.start[0]} }",
+    ],
+)
+def test_incremental_reparse_moves_rows(action: str) -> None:
+    grammar_source = f"""
+    start: stmt* ENDMARKER
+    stmt: NAME '=' NUMBER NEWLINE {action}
+    """
+    parser_class = make_parser(grammar_source)
+    source = "".join(f"x{i} = {i}\n" for i in range(20))
+    tokenizer = IncrementalTokenizer(source)
+    parser = parser_class(tokenizer)
+    parser.start()
+    for offset, removed, inserted in [(14, 0, "y = 1\n\n"), (0, 7, "")]:
+        parser.edit(offset, removed, inserted)
+        tree = parser.start()
+        source = source[:offset] + inserted + source[offset + removed :]
+        fresh = parser_class(Tokenizer(tokenize.generate_tokens(io.StringIO(source).readline)))
+        if action.startswith("{ ast"):
+            dump = functools.partial(ast.dump, include_attributes=True)
+            assert list(map(dump, tree[0])) == list(map(dump, fresh.start()[0]))
+        else:
+            assert tree == fresh.start()
+        if "row" not in action:
+            # The statements after the edit were not parsed again, nor
+            # their tokens read.
+            assert tokenizer._stale
+
+
+def test_incremental_reparse_requires_incremental_tokenizer() -> None:
+    parser_class = make_parser("start: NAME")
+    parser = parser_class(Tokenizer(tokenize.generate_tokens(io.StringIO("x\n").readline)))
+    with pytest.raises(TypeError):
+        parser.edit(0, 1, "y")
+
+
+@pytest.mark.parametrize("tokenizer_class", [Tokenizer, CompactTokenizer])
+def test_stream(tokenizer_class: Type[Tokenizer]) -> None:
+    grammar_source = """
+    start: stmt* ENDMARKER
+    stmt: NAME '=' sum NEWLINE { (name.string, sum) }
+    sum: sum '+' term { (sum, term) } | term
+    term: NUMBER { number.string } | NAME { name.string }
+    """
+    parser_class = make_parser(grammar_source)
+    source = "".join(f"x{i} = {i} + y\n" for i in range(100))
+    parser = parser_class(tokenizer_class(generate_line_tokens(io.StringIO(source).readline)))
+    memo_sizes = []
+    results = []
+    for tree in parser.stream("stmt"):
+        results.append(tree)
+        memo_sizes.append(parser.memo_size())
+        assert len(parser._memo) <= 7
+    assert results == [(f"x{i}", ([str(i)], "y")) for i in range(100)]
+    assert max(memo_sizes[1:]) == memo_sizes[1]
+    assert tokenizer_class is not Tokenizer or len(parser._tokenizer._tokens) <= 7
+
+    readline = io.StringIO("a = 1\nb =\n").readline
+    parser = parser_class(tokenizer_class(generate_line_tokens(readline)))
+    stream = parser.stream("stmt", "input.txt")
+    assert next(stream) == ("a", ["1"])
+    with pytest.raises(SyntaxError) as error:
+        next(stream)
+    assert error.value.args[1][:2] == ("input.txt", 2)
+
+
+def test_stream_nullable_rule() -> None:
+    grammar_source = """
+    start: stmt* ENDMARKER
+    stmt: NAME? NEWLINE? { 'stmt' }
+    """
+    parser_class = make_parser(grammar_source)
+    readline = io.StringIO("a\nb\n42\n").readline
+    parser = parser_class(Tokenizer(generate_line_tokens(readline)))
+    stream = parser.stream("stmt", "input.txt")
+    assert list(itertools.islice(stream, 2)) == ["stmt", "stmt"]
+    with pytest.raises(SyntaxError) as error:
+        next(stream)
+    assert error.value.args[1][:2] == ("input.txt", 3)
+
+
+@pytest.mark.parametrize("tokenizer_class", [Tokenizer, CompactTokenizer])
+def test_parse_many(tokenizer_class: Type[Tokenizer]) -> None:
+    parser_class = make_parser(
+        """
+        start: sum NEWLINE ENDMARKER { sum }
+        sum: sum '+' term { (sum, term) } | term
+        term: NUMBER { number.string } | NAME { name.string }
+        """
+    )
+    stats = MemoStats()
+    parser = parser_class(tokenizer_class(generate_source_tokens("")), memo_stats=stats)
+    results = []
+    for tree in parser.parse_many(["1 + a\n", "2 +\n", "b\n"]):
+        if tree is None:
+            assert parser.make_syntax_error().args[1][1:3] == (1, 4)
+        results.append(tree)
+    assert results == [(["1"], "a"), None, ["b"]]
+    assert stats.counts["sum"][1] == 3  # One miss per source
+
+    parser.restart(generate_source_tokens("c + 3\n"))
+    assert parser.start() == (["c"], "3")
+    assert parser.memo_size() > 0
+
+
 def test_dangling_reference() -> None:
     grammar = """
     start: foo ENDMARKER
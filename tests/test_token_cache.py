@@ -0,0 +1,88 @@
+import mmap
+import os
+import tokenize
+from typing import Any
+
+import pytest  # type: ignore
+
+from pegen.token_cache import TokenCache
+from pegen.tokenizer import Tokenizer, generate_source_tokens
+
+from .utils import make_parser
+
+SOURCE = """\
+def f(x):  # comment
+    return x + '''a
+b''' + 'c\\
+d'
+"""
+
+
+def test_token_cache(tmp_path: Any) -> None:
+    expected = list(generate_source_tokens(SOURCE))
+    cache = TokenCache(str(tmp_path))
+    assert list(cache.generate_tokens(SOURCE)) == expected
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert os.path.exists(cache.path(SOURCE))
+
+    # Another process sharing the directory.
+    cache = TokenCache(str(tmp_path))
+    assert list(cache.generate_tokens(SOURCE)) == expected
+    assert list(cache.generate_tokens("x = 1\n")) == list(generate_source_tokens("x = 1\n"))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.report() == "1 hits, 1 misses (50% hit rate)"
+
+
+def test_token_cache_corrupt_file(tmp_path: Any) -> None:
+    cache = TokenCache(str(tmp_path))
+    list(cache.generate_tokens(SOURCE))
+    with open(cache.path(SOURCE), "r+b") as file:
+        file.truncate(20)
+    assert list(cache.generate_tokens(SOURCE)) == list(generate_source_tokens(SOURCE))
+    assert cache.misses == 2
+    assert list(cache.generate_tokens(SOURCE)) == list(generate_source_tokens(SOURCE))
+    assert cache.hits == 1
+
+
+def test_token_cache_closes_mapping(tmp_path: Any, monkeypatch: Any) -> None:
+    mappings = []
+    original_mmap = mmap.mmap
+
+    def recording_mmap(*args: Any, **kwargs: Any) -> mmap.mmap:
+        mappings.append(original_mmap(*args, **kwargs))
+        return mappings[-1]
+
+    cache = TokenCache(str(tmp_path))
+    list(cache.generate_tokens(SOURCE))
+    monkeypatch.setattr("pegen.token_cache.mmap.mmap", recording_mmap)
+    tokens = cache.generate_tokens(SOURCE)
+    assert cache.hits == 1
+    # The consumer stops early, but the generator is still referenced.
+    assert next(tokens).string == "def"
+    assert len(mappings) == 1 and mappings[0].closed
+
+
+def test_token_cache_tokenize_error(tmp_path: Any) -> None:
+    cache = TokenCache(str(tmp_path))
+    tokens = cache.generate_tokens("x = (\n")
+    assert next(tokens).string == "x"
+    with pytest.raises(tokenize.TokenError):
+        list(tokens)
+    assert not os.listdir(tmp_path)
+
+
+def test_token_cache_parse(tmp_path: Any) -> None:
+    parser_class = make_parser(
+        """
+        start: sum NEWLINE $
+        sum: sum '+' term | term
+        term: NUMBER | NAME
+        """
+    )
+    cache = TokenCache(str(tmp_path))
+    results = []
+    for _ in range(2):
+        parser = parser_class(Tokenizer(cache.generate_tokens("1 + a\n")))
+        results.append(parser.start())
+    assert results[0] == results[1]
+    assert cache.hits == 1
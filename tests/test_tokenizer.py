@@ -0,0 +1,230 @@
+import io
+import token
+import tokenize
+from typing import Any, List
+
+import pytest  # type: ignore
+
+from pegen.tokenizer import (
+    CompactTokenizer,
+    IncrementalTokenizer,
+    Tokenizer,
+    generate_line_tokens,
+    generate_source_tokens,
+    read_source,
+)
+
+from .utils import make_parser
+
+SOURCE = """\
+def f(x):  # comment
+    return x + 'a' \\
+        + '''b
+c'''
+
+f(1)
+"""
+
+
+def all_tokens(tokenizer: Tokenizer) -> List[tokenize.TokenInfo]:
+    tokens = [tokenizer.getnext()]
+    while tokens[-1].type != tokenize.ENDMARKER:
+        tokens.append(tokenizer.getnext())
+    return tokens
+
+
+def make_tokenizer(cls: type, source: str, verbose: bool = False) -> Tokenizer:
+    return cls(tokenize.generate_tokens(io.StringIO(source).readline), verbose=verbose)
+
+
+def test_compact_tokenizer() -> None:
+    expected = all_tokens(make_tokenizer(Tokenizer, SOURCE))
+    tokenizer = make_tokenizer(CompactTokenizer, SOURCE)
+    assert all_tokens(tokenizer) == expected
+    assert tokenizer.diagnose() == expected[-1]
+
+    tokenizer.reset(2)
+    assert tokenizer.peek() == expected[2]
+    assert tokenizer.match_type(tokenize.NAME) is None
+    assert tokenizer.match_string("(") == expected[2]
+    assert tokenizer.match_type(tokenize.NAME) == expected[3]
+    assert tokenizer.mark() == 4
+
+
+def test_compact_tokenizer_verbose(capsys: Any) -> None:
+    expected = all_tokens(make_tokenizer(Tokenizer, SOURCE))
+    assert all_tokens(make_tokenizer(CompactTokenizer, SOURCE, verbose=True)) == expected
+
+
+def test_compact_tokenizer_release() -> None:
+    expected = all_tokens(make_tokenizer(Tokenizer, SOURCE))
+    tokenizer = make_tokenizer(CompactTokenizer, SOURCE)
+    all_tokens(tokenizer)
+    tokenizer.release(10)
+    tokenizer.reset(9)
+    assert all_tokens(tokenizer) == expected[9:]
+    tokenizer.release(len(expected))
+    assert tokenizer.diagnose() == expected[-1]
+
+
+@pytest.mark.parametrize("cls", [Tokenizer, CompactTokenizer])
+def test_rebase(cls: type) -> None:
+    expected = all_tokens(make_tokenizer(Tokenizer, SOURCE))
+    tokenizer = make_tokenizer(cls, SOURCE)
+    for _ in range(12):
+        tokenizer.getnext()
+    tokenizer.rebase(10)
+    assert tokenizer.mark() == 3
+    tokenizer.reset(1)
+    assert all_tokens(tokenizer) == expected[10:]
+    assert tokenizer.diagnose() == expected[-1]
+    tokenizer.rebase(1)
+    assert tokenizer.mark() == len(expected) - 9
+
+
+def test_compact_tokenizer_parse() -> None:
+    parser_class = make_parser(
+        """
+        start: sum NEWLINE $
+        sum: sum '+' term | term
+        term: NUMBER | NAME
+        """
+    )
+    results = []
+    for cls in (Tokenizer, CompactTokenizer):
+        parser = parser_class(make_tokenizer(cls, "1 + a + 2\n"))
+        results.append(parser.start())
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        SOURCE,
+        "",
+        "x",
+        "if x:\n    y\n  # comment\n\n\tz = 1",
+        "a = (1,\n     2)  # comment\nb = 'x\\\ny'\n",
+        "s = r'''\\\n'''; t = f\"{x}\" $ ?\n",
+        "x = 1 \\\n  + 2\r\n\x0cy\n",
+        "'unterminated\nx\n",
+        "x = 1.5j + 0x_f + .5 + ...\n",
+    ],
+)
+def test_generate_source_tokens(source: str) -> None:
+    tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+    expected = [
+        tok
+        for tok in tokens
+        if tok.type not in (tokenize.NL, tokenize.COMMENT)
+        and not (tok.type == token.ERRORTOKEN and tok.string.isspace())
+    ]
+    assert list(generate_source_tokens(source)) == expected
+    assert list(generate_line_tokens(io.StringIO(source).readline)) == expected
+
+
+@pytest.mark.parametrize(
+    "source, error",
+    [
+        ("x = '''\n", tokenize.TokenError),
+        ("x = (1,\n", tokenize.TokenError),
+        ("if x:\n    y\n  z\n", IndentationError),
+    ],
+)
+def test_generate_source_tokens_errors(source: str, error: type) -> None:
+    with pytest.raises(error) as expected:
+        list(tokenize.generate_tokens(io.StringIO(source).readline))
+    with pytest.raises(error) as raised:
+        list(generate_source_tokens(source))
+    assert raised.value.args == expected.value.args
+
+
+@pytest.mark.parametrize(
+    "old, new, resynced",
+    [
+        ("x = 1\ny = 2\nz = 3\n", "x = 1\ny = 42\nz = 3\n", True),
+        ("x = 1\ny = 2\nz = 3\n", "x = 1\ny = (2,\n     4)\nz = 3\n", True),
+        ("x = 1\ny = 2\nz = 3\n", "x = 1\nz = 3\n", True),
+        ("def f():\n    a\n    b\nc\n", "def f():\n    a\n    bb\nc\n", True),
+        ("def f():\n    a\nc\n", "def f():\n    a\n    c\n", False),
+        ("x = 1\ny = 2\nz = 3\n", "x = 1\ny = '''2\nz = 3\n", False),
+        ("x = 1\ny = '''2\nz = 3\n", "x = 1\ny = 2\nz = 3\n", False),
+        ("x = 1\ny = 2", "x = 1\ny = 2 + 3", True),
+    ],
+)
+def test_incremental_tokenizer(old: str, new: str, resynced: bool) -> None:
+    # Replace the part of old that differs from new.
+    offset = 0
+    while old[offset : offset + 1] == new[offset : offset + 1]:
+        offset += 1
+    suffix = 0
+    while suffix < min(len(old), len(new)) - offset and old[-suffix - 1] == new[-suffix - 1]:
+        suffix += 1
+    tokenizer = IncrementalTokenizer(old)
+    try:
+        all_tokens(tokenizer)
+    except tokenize.TokenError:
+        pass
+    change = tokenizer.edit(offset, len(old) - suffix - offset, new[offset : len(new) - suffix])
+    assert tokenizer.source == new
+    assert change.resynced == resynced
+    assert tokenizer.mark() == 0
+    try:
+        expected = list(generate_source_tokens(new))
+    except tokenize.TokenError:
+        with pytest.raises(tokenize.TokenError):
+            all_tokens(tokenizer)
+    else:
+        assert all_tokens(tokenizer) == expected
+
+
+def test_incremental_tokenizer_moves_rows_lazily() -> None:
+    source = "".join(f"x{i} = {i}\n" for i in range(20))
+    tokenizer = IncrementalTokenizer(source)
+    old_tokens = all_tokens(tokenizer)
+    for offset, removed, inserted in [(14, 0, "y = (1,\n2)\n"), (0, 7, ""), (60, 0, "\n\n")]:
+        tokenizer.edit(offset, removed, inserted)
+        source = source[:offset] + inserted + source[offset + removed :]
+        assert tokenizer._stale
+        # Reading a token moves it, but not the ones around it.
+        tokenizer.reset(30)
+        assert tokenizer.getnext() == list(generate_source_tokens(source))[30]
+        assert tokenizer._tokens[-2] is old_tokens[-2]
+        tokenizer.reset(0)
+        assert all_tokens(tokenizer) == list(generate_source_tokens(source))
+        assert not tokenizer._stale
+        old_tokens = tokenizer._tokens[:]
+
+
+def test_incremental_tokenizer_examined() -> None:
+    tokenizer = IncrementalTokenizer("x = 1\n")
+    assert tokenizer.match_string("x")
+    assert not tokenizer.match_type(tokenize.NAME)
+    assert tokenizer._examined == 2
+    tokenizer.reset(0)
+    tokenizer.getnext()
+    assert tokenizer._examined == 2
+    with pytest.raises(ValueError):
+        tokenizer.edit(5, 3, "")
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"", ""),
+        (b"x = '\xc3\xa9'\r\n", "x = 'é'\r\n"),
+        (b"\xef\xbb\xbfx = 1\n", "x = 1\n"),
+        (b"# -*- coding: latin-1 -*-\nx = '\xe9'\n", "# -*- coding: latin-1 -*-\nx = 'é'\n"),
+    ],
+)
+def test_read_source(tmp_path: Any, data: bytes, expected: str) -> None:
+    path = tmp_path / "source.py"
+    path.write_bytes(data)
+    with open(path, "rb") as file:
+        assert read_source(file) == expected
+    assert read_source(io.BytesIO(data)) == expected
+
+
+def test_read_source_bad_cookie() -> None:
+    with pytest.raises(SyntaxError):
+        read_source(io.BytesIO(b"# coding: nonsense\n"))
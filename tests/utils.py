@@ -5,14 +5,14 @@ import pathlib
 import sys
 import textwrap
 import token
-import tokenize
 from typing import IO, Any, Dict, Final, Type, cast
 
+from pegen.build_cache import make_parser_class
 from pegen.grammar import Grammar
 from pegen.grammar_parser import GeneratedParser as GrammarParser
 from pegen.parser import Parser
 from pegen.python_generator import PythonParserGenerator
-from pegen.tokenizer import Tokenizer
+from pegen.tokenizer import Tokenizer, generate_source_tokens, read_source
 
 ALL_TOKENS = token.tok_name
 EXACT_TOKENS = token.EXACT_TOKEN_TYPES  # type: ignore
@@ -35,7 +35,7 @@ def generate_parser(grammar: Grammar) -> Type[Parser]:
 
 def run_parser(file: IO[bytes], parser_class: Type[Parser], *, verbose: bool = False) -> Any:
     # Run a parser on a file (stream).
-    tokenizer = Tokenizer(tokenize.generate_tokens(file.readline))  # type: ignore # typeshed issue #3515
+    tokenizer = Tokenizer(generate_source_tokens(read_source(file)))  # type: ignore
     parser = parser_class(tokenizer, verbose=verbose)
     result = parser.start()
     if result is None:
@@ -49,14 +49,14 @@ def parse_string(
     # Run the parser on a string.
     if dedent:
         source = textwrap.dedent(source)
-    file = io.StringIO(source)
-    return run_parser(file, parser_class, verbose=verbose)  # type: ignore # typeshed issue #3515
+    file = io.BytesIO(source.encode("utf-8"))
+    return run_parser(file, parser_class, verbose=verbose)
 
 
 def make_parser(source: str) -> Type[Parser]:
-    # Combine parse_string() and generate_parser().
-    grammar = parse_string(source, GrammarParser)
-    return generate_parser(grammar)
+    # Combine parse_string() and generate_parser(), reusing the parser
+    # classes already generated for the same grammar.
+    return make_parser_class(textwrap.dedent(source))
 
 
 def import_file(full_name: str, path: str) -> Any: